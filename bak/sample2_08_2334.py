@@ -1,10 +1,58 @@
 #!/usr/bin/env python
 import csv
 import json
+import re
 import sys
 import string
 from typing import List, Tuple, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で出力する
+    orjson = None
+
+# 行頭のインデント（orjson の2スペースインデントを4スペースに揃えるため）
+_LEADING_SPACES_RE = re.compile(r'^ +', re.MULTILINE)
+
+# ─────────────────────────────
+# JSON 出力用の補助関数
+# ─────────────────────────────
+
+def _orjson_compatible(data: Any) -> bool:
+    """
+    data 内の float がすべて orjson でも標準の json と同じ表記になるかを返す。
+    指数表記になる範囲（1e-4 未満、1e16 以上）や inf / nan を含む場合は False とする。
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if type(value) is float:
+            # nan は比較がすべて偽、inf は上限を超えるため、ここで除外される
+            if value and not 1e-4 <= abs(value) < 1e16:
+                return False
+        elif type(value) is dict:
+            stack.extend(value.values())
+        elif type(value) is list:
+            stack.extend(value)
+    return True
+
+def dumps_json(data: Any) -> str:
+    """
+    data を4スペースインデントの JSON 文字列に変換する（非 ASCII 文字はそのまま出力する）。
+    orjson が利用できる場合はそちらで変換し、インデント幅だけ標準の json に合わせる。
+    float の表記が標準の json と異なってしまう場合は、標準の json で変換する。
+    """
+    if orjson is not None and _orjson_compatible(data):
+        try:
+            text = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            # 64bitを超える整数や文字列以外のキーなど orjson で扱えない値は標準の json にまかせる
+            pass
+        else:
+            # JSON 文字列中の改行はエスケープされるため、行頭の空白はすべてインデントとみなせる
+            return _LEADING_SPACES_RE.sub(lambda m: m.group(0) * 2, text)
+    return json.dumps(data, indent=4, ensure_ascii=False)
+
 # ─────────────────────────────
 # ヘッダー部のパス（階層情報）を作成するための補助関数群
 # ─────────────────────────────
@@ -124,8 +172,17 @@ def set_value(record: Dict[str, Any], path: List[Tuple[str, bool]], value: str,
                     current[field] = {}
                 current = current[field]
 
+def compile_columns(col_to_path: Dict[int, List[Tuple[str, bool]]],
+                    num_cols: int) -> List[Tuple[int, List[Tuple[str, bool]]]]:
+    """
+    データ行の処理対象となる列（パスを持ち、num_cols 未満の列）を
+    (列番号, パス) の一覧として列番号順に返す。ヘッダーから一度だけ作成しておく。
+    """
+    return [(col, col_to_path[col]) for col in sorted(col_to_path) if col < num_cols]
+
 def process_record_group(rows: List[List[str]], col_to_path: Dict[int, List[Tuple[str, bool]]],
-                         num_cols: int) -> Dict[str, Any]:
+                         num_cols: int,
+                         columns: Optional[List[Tuple[int, List[Tuple[str, bool]]]]] = None) -> Dict[str, Any]:
     """
     １レコードに属する複数行（最初の行は新規レコード、以降は "*" マーカーの継続行）
     を受け取り、col_to_path に従って入れ子構造の辞書（レコード）を作成して返す。
@@ -133,17 +190,20 @@ def process_record_group(rows: List[List[str]], col_to_path: Dict[int, List[Tupl
     ★ 新規レコード行では各セルの値をそのままセットし、
       継続行では、行内で非空セルがある各配列フィールドについて
       新規要素を生成して値をセットする（同じ配列フィールドは同じ継続行内では 1 つの要素にまとめる）。
+    columns には compile_columns の結果を渡せる（省略時はここで作成する）。
     """
+    if columns is None:
+        columns = compile_columns(col_to_path, num_cols)
     record: Dict[str, Any] = {}
     # まず、新規レコード行（マーカーが空文字）の処理
     base = rows[0]
     # 右側不足分を補完
     if len(base) < num_cols:
         base += [""] * (num_cols - len(base))
-    for col in range(num_cols):
-        cell = base[col].strip() if col < len(base) else ""
-        if cell and col in col_to_path:
-            set_value(record, col_to_path[col], cell)
+    for col, path in columns:
+        cell = base[col].strip()
+        if cell:
+            set_value(record, path, cell)
     # 継続行の処理
     for row in rows[1:]:
         # row[0] はマーカー（"*"）なので、以降のセルが対象
@@ -152,10 +212,10 @@ def process_record_group(rows: List[List[str]], col_to_path: Dict[int, List[Tupl
             data += [""] * (num_cols - len(data))
         # cont_elements: 継続行内で作成した各配列新規要素を記録する
         cont_elements: Dict[Tuple[str, ...], Dict[str, Any]] = {}
-        for col in range(num_cols):
-            cell = data[col].strip() if col < len(data) else ""
-            if cell and col in col_to_path:
-                set_value(record, col_to_path[col], cell, cont_elements)
+        for col, path in columns:
+            cell = data[col].strip()
+            if cell:
+                set_value(record, path, cell, cont_elements)
     return record
 
 # ─────────────────────────────
@@ -216,9 +276,11 @@ def process_csv(csv_filename: str) -> Dict[str, Any]:
         record_groups.append(current_group)
     
     # 各レコードグループを処理してレコードを作成
+    # 処理対象の列はヘッダーから一度だけ求めておき、各レコードで使い回す
+    columns = compile_columns(col_to_path, num_cols)
     records = []
     for group in record_groups:
-        rec = process_record_group(group, col_to_path, num_cols)
+        rec = process_record_group(group, col_to_path, num_cols, columns)
         records.append(rec)
     
     return {
@@ -234,7 +296,7 @@ class Record:
     def __init__(self, data: Dict[str, Any]):
         self.data = data
     def to_json(self) -> str:
-        return json.dumps(self.data, indent=4, ensure_ascii=False)
+        return dumps_json(self.data)
 
 # ─────────────────────────────
 # メイン処理
@@ -247,4 +309,4 @@ if __name__ == "__main__":
     filename = sys.argv[1]
     result = process_csv(filename)
     # ヘッダー解析結果とレコード情報をまとめて出力
-    print(json.dumps(result, indent=4, ensure_ascii=False))
+    print(dumps_json(result))
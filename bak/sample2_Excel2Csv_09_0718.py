@@ -1,8 +1,18 @@
 import openpyxl
 import csv
 import sys
-from openpyxl.utils import get_column_letter, column_index_from_string
-from typing import Optional, Tuple, List, NamedTuple
+from itertools import chain
+from xml.etree.ElementTree import iterparse
+from openpyxl.utils import column_index_from_string
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from typing import Any, Dict, Iterable, Optional, Tuple, List, NamedTuple
+
+# シートXML内の結合セル要素のタグ名
+MERGE_CELL_TAG = f'{{{SHEET_MAIN_NS}}}mergeCell'
+
+# CSV書き出し時のバッファサイズ（書き込みのシステムコール回数を減らす）
+WRITE_BUFFER_SIZE = 1 << 20
 
 class TargetRange(NamedTuple):
     start_row: int
@@ -24,7 +34,8 @@ def process_excel(
     """
     try:
         # エクセルファイルを開く
-        workbook = openpyxl.load_workbook(excel_file, data_only=True)
+        # read_only で開き、セルを逐次読み込む（全セルのオブジェクトをメモリ上に展開しない）
+        workbook = openpyxl.load_workbook(excel_file, data_only=True, read_only=True)
         
         # シート名の決定
         if sheet_name is None:
@@ -42,69 +53,119 @@ def process_excel(
         start_col = column_index_from_string(start_cell[0])
         layout_start_row = int(start_cell[1:])
 
-        # LAYOUTの行を探す
-        layout_row = find_layout_row(sheet, layout_start_row)
+        # シート全体の値を一度だけ読み込む（以降はセルオブジェクトを介さず参照する）
+        grid = load_sheet_values(sheet, start_col)
+        # 結合セルは座標から (左上セルの値, 左上セルかどうか) を引けるようにしておく
+        merged_map = build_merged_map(sheet, grid, excel_file)
+        # 必要な情報は読み込み済みなので、ファイルを閉じる
+        workbook.close()
+
+        # LAYOUTの最初と最後の行を探す
+        layout_row, layout_last_row = find_layout_range(grid, layout_start_row)
         if layout_row is None:
             raise ValueError("LAYOUT row not found")
-        layout_last_row = find_layout_last_row(sheet, layout_start_row)
 
         # 対象となる列を特定（1列目は常に含める）
-        target_cols = [start_col] + find_target_columns(sheet, start_col, layout_row)
+        target_cols = [start_col] + find_target_columns(grid, merged_map, start_col, layout_row)
         
-        csv_layout = create_csv_layout(sheet, layout_start_row, target_cols)
+        csv_layout = create_csv_layout(grid, merged_map, layout_start_row, target_cols)
 
         # データ範囲を特定
-        target_range = find_target_range(sheet, layout_last_row, target_cols)
+        target_range = find_target_range(grid, layout_last_row, target_cols)
         
         # CSVデータの作成
-        csv_data = create_csv_data(sheet, target_range)
+        csv_data = create_csv_data(grid, merged_map, target_range)
         
         # CSVファイルの出力
         output_filename = f"{excel_file.rsplit('.', 1)[0]}.csv"
-        write_csv(output_filename,csv_layout + csv_data)
+        # LAYOUT行とデータ行はリストを連結せずに順に書き出す
+        write_csv(output_filename, chain(csv_layout, csv_data))
         
     except Exception as e:
         print(f"Error processing Excel file: {str(e)}")
         sys.exit(1)
 
-def find_layout_row(sheet, start_row: int) -> Optional[int]:
+def load_sheet_values(sheet, min_cols: int = 1) -> List[Tuple[Any, ...]]:
     """
-    LAYOUT行を探す
+    シートの全セルの値を iter_rows で一括取得する。
+    行・列とも 1-indexed のセル (row, col) は grid[row - 1][col - 1] で参照できる。
     """
-    max_row = sheet.max_row
-    for row in range(start_row, max_row + 1):
-        cell_value = str(sheet.cell(row=row, column=1).value or '').upper()
-        if cell_value == 'LAYOUT':
-            return row
-    return None
+    rows = list(sheet.iter_rows(min_row=1, min_col=1, values_only=True))
+    # read_only モードではシートの寸法が不明な場合があるため、最長の行に揃えて右側を補完する
+    width = max([min_cols] + [len(row) for row in rows])
+    return [row if len(row) == width else tuple(row) + (None,) * (width - len(row)) for row in rows]
 
-def find_layout_last_row(sheet, start_row: int) -> Optional[int]:
+def read_merged_ranges(sheet, excel_file: Optional[str] = None) -> List[CellRange]:
     """
-    LAYOUT行の最後の行を探す
+    シートの結合セル範囲を返す。
+    read_only モードのシートは merged_cells を持たないため、シートのXMLから mergeCell 要素を読み取る。
+    XMLの読み出しには openpyxl 内部の _get_source() を使うので、それが無い版では
+    excel_file を通常モードで開き直して merged_cells を参照する。
     """
-    max_row = sheet.max_row
-    layout_rows = []
+    if hasattr(sheet, 'merged_cells'):
+        return list(sheet.merged_cells.ranges)
+    get_source = getattr(sheet, '_get_source', None)
+    if get_source is None:
+        if excel_file is None:
+            raise ValueError("結合セル範囲を読み取れません（excel_file を指定してください）")
+        workbook = openpyxl.load_workbook(excel_file)
+        try:
+            return list(workbook[sheet.title].merged_cells.ranges)
+        finally:
+            workbook.close()
+    ranges = []
+    with get_source() as src:
+        for _, element in iterparse(src):
+            if element.tag == MERGE_CELL_TAG:
+                ranges.append(CellRange(element.get('ref')))
+            element.clear()
+    return ranges
+
+def build_merged_map(sheet, grid: List[Tuple[Any, ...]], excel_file: Optional[str] = None) -> Dict[Tuple[int, int], Tuple[Any, bool]]:
+    """
+    結合セル範囲を走査し、(row, col) → (左上セルの値, 左上セルかどうか) の辞書を作成する。
+    セルごとに merged_cells.ranges を線形探索しなくて済むようにするためのもの。
+    """
+    merged_map = {}
+    for merge_range in read_merged_ranges(sheet, excel_file):
+        min_row, min_col = merge_range.min_row, merge_range.min_col
+        anchor_value = grid[min_row - 1][min_col - 1]
+        for row in range(min_row, merge_range.max_row + 1):
+            for col in range(min_col, merge_range.max_col + 1):
+                merged_map[(row, col)] = (anchor_value, row == min_row and col == min_col)
+    return merged_map
+
+def find_layout_range(grid: List[Tuple[Any, ...]], start_row: int) -> Tuple[Optional[int], Optional[int]]:
+    """
+    LAYOUT行の最初の行と最後の行を1回の走査で探す
+    """
+    max_row = len(grid)
+    first_row = None
+    last_row = None
     for row in range(start_row, max_row + 1):
-        cell_value = str(sheet.cell(row=row, column=1).value or '').upper()
+        cell_value = str(grid[row - 1][0] or '').upper()
         if cell_value == 'LAYOUT':
-            layout_rows.append(row)
-    return layout_rows[-1]
+            if first_row is None:
+                first_row = row
+            last_row = row
+    return first_row, last_row
 
-def create_csv_layout(sheet, layout_start_row: int, target_cols: List[int]) -> List[str]:
+def create_csv_layout(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]], layout_start_row: int, target_cols: List[int]) -> List[str]:
     """
     LAYOUT行の内容をCSV形式に変換する
     """
-    max_row = sheet.max_row
+    max_row = len(grid)
+    first_col = target_cols[0]
     layout_rows = []
     for row in range(layout_start_row, max_row + 1):
         row_data = []
-        cell_value = str(sheet.cell(row=row, column=1).value or '').upper()
+        cell_value = str(grid[row - 1][0] or '').upper()
         if cell_value == 'LAYOUT':
             for col in target_cols:
-                if col == target_cols[0]:  # 1列目は特別処理
-                    value = process_layout_cell_value(sheet, row, col, check_prefix=False)
+                if col == first_col:  # 1列目は特別処理
+                    value = process_layout_cell_value(grid, merged_map, row, col, check_prefix=False)
                 else:
-                    value = process_layout_cell_value(sheet, row, col, check_prefix=True)
+                    value = process_layout_cell_value(grid, merged_map, row, col, check_prefix=True)
                 #print(f'row:{row} col:{col} value:{value}')
 
                 row_data.append(value)
@@ -113,34 +174,36 @@ def create_csv_layout(sheet, layout_start_row: int, target_cols: List[int]) -> L
 
 
 
-def find_target_columns(sheet, start_col: int, layout_row: int) -> List[int]:
+def find_target_columns(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]],
+                        start_col: int, layout_row: int) -> List[int]:
     """
     プレフィックスが#である値を含む列を特定する
 
     """
     target_cols = []
-    max_col = sheet.max_column
+    max_col = len(grid[0]) if grid else 0
+    layout_values = grid[layout_row - 1]
+    get_merged = merged_map.get
     
     for col in range(start_col + 1, max_col + 1):  # 2列目以降を検査
-        cell = sheet.cell(row=layout_row, column=col)
+        merged = get_merged((layout_row, col))
         
         # 結合セルの処理
-        if cell.coordinate in sheet.merged_cells:
-            merge_range = next(range for range in sheet.merged_cells.ranges if cell.coordinate in range)
-            value = sheet.cell(row=merge_range.min_row, column=merge_range.min_col).value
+        if merged is not None:
+            value = merged[0]
         else:
-            value = cell.value
+            value = layout_values[col - 1]
             
         if value and isinstance(value, str) and value.startswith('#'):
             target_cols.append(col)
     
     return target_cols
 
-def find_target_range(sheet, layout_last_row: int, target_cols: List[int]) -> TargetRange:
+def find_target_range(grid: List[Tuple[Any, ...]], layout_last_row: int, target_cols: List[int]) -> TargetRange:
     """
     対象となるデータの範囲を特定する
     """
-    max_row = sheet.max_row
+    max_row = len(grid)
     start_keywords = ['START']
     skip_keywords = ['NONE', 'NOT', 'NO']
     end_keywords = ['END', 'FINISH', 'FIN']
@@ -148,7 +211,7 @@ def find_target_range(sheet, layout_last_row: int, target_cols: List[int]) -> Ta
     # 開始行の特定
     start_row = layout_last_row + 1  # デフォルトはLAYOUTの次の行
     for row in range(layout_last_row + 1, max_row + 1):
-        cell_value = str(sheet.cell(row=row, column=1).value or '').upper()
+        cell_value = str(grid[row - 1][0] or '').upper()
         if cell_value in start_keywords:
             start_row = row
 
@@ -157,49 +220,50 @@ def find_target_range(sheet, layout_last_row: int, target_cols: List[int]) -> Ta
     # 終了行の特定
     end_row = max_row
     for row in range(start_row, max_row + 1):
-        cell_value = str(sheet.cell(row=row, column=1).value or '').upper()
+        cell_value = str(grid[row - 1][0] or '').upper()
         if cell_value in end_keywords:
             end_row = row - 1
             break
     
     return TargetRange(start_row, end_row, target_cols)
 
-def create_csv_data(sheet, target_range: TargetRange) -> List[List[str]]:
+def create_csv_data(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]], target_range: TargetRange) -> List[List[str]]:
     """
     CSVデータを作成する
     """
     csv_data = []
     skip_keywords = ['NONE', 'NOT', 'NO']
+    target_cols = target_range.target_cols
+    first_col = target_cols[0]
+    # 列ごとに使う処理関数を先に決めておく（1列目は特別処理で '#' を除去しない）
+    column_funcs = [
+        (process_cell_value_plain if col == first_col else process_cell_value_prefixed, col)
+        for col in target_cols
+    ]
     
     for row in range(target_range.start_row, target_range.end_row + 1):
         # スキップ条件のチェック
-        first_col_value = str(sheet.cell(row=row, column=1).value or '').lower()
+        first_col_value = str(grid[row - 1][0] or '').lower()
         if first_col_value in skip_keywords:
             continue
             
-        row_data = []
-        for col in target_range.target_cols:
-            #cell = sheet.cell(row=row, column=col)
-            if col == target_range.target_cols[0]:  # 1列目は特別処理
-                value = process_cell_value(sheet, row, col, check_prefix=False)
-            else:
-                value = process_cell_value(sheet, row, col, check_prefix=True)
-            row_data.append(value)
+        row_data = [func(grid, merged_map, row, col) for func, col in column_funcs]
         csv_data.append(row_data)
     
     return csv_data
 
-def process_layout_cell_value(sheet, row: int, col: int, check_prefix: bool = True) -> str:
+def process_layout_cell_value(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]],
+                              row: int, col: int, check_prefix: bool = True) -> str:
     """
     セルの値を処理する
     """
-    cell = sheet.cell(row=row, column=col)
+    merged = merged_map.get((row, col))
     
     # 連結セルのチェック
-    if cell.coordinate in sheet.merged_cells:
-        merge_range = next(range for range in sheet.merged_cells.ranges if cell.coordinate in range)
-        if cell.coordinate == merge_range.start_cell.coordinate:
-            value = cell.value
+    if merged is not None:
+        anchor_value, is_anchor = merged
+        if is_anchor:
+            value = anchor_value
             if value.startswith('#'):
                 value = value[1:]  # #を除去
             else:
@@ -208,43 +272,72 @@ def process_layout_cell_value(sheet, row: int, col: int, check_prefix: bool = Tr
             return '<'
     
     # 通常のセル
-    value = cell.value
+    value = grid[row - 1][col - 1]
     if check_prefix and value and isinstance(value, str):
         if value.startswith('#'):
             value = value[1:]  # #を除去
         else:
             value = "" # #で始まるセルでなければ除外する
+    # 文字列セルはそのまま返し、数値などの場合のみ str() で変換する
+    if isinstance(value, str):
+        return value
     return str(value) if value is not None else ''
 
 
-def process_cell_value(sheet, row: int, col: int, check_prefix: bool = True) -> str:
+def process_cell_value_plain(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]],
+                             row: int, col: int) -> str:
     """
-    セルの値を処理する
+    セルの値を処理する（'#' プレフィックスを除去しない列用）
+    """
+    merged = merged_map.get((row, col))
+    
+    # 連結セルのチェック
+    if merged is not None:
+        anchor_value, is_anchor = merged
+        if is_anchor:
+            return anchor_value
+        else:
+            return '<'
+    
+    # 通常のセル
+    value = grid[row - 1][col - 1]
+    # 文字列セルはそのまま返し、数値などの場合のみ str() で変換する
+    if isinstance(value, str):
+        return value
+    return str(value) if value is not None else ''
+
+def process_cell_value_prefixed(grid: List[Tuple[Any, ...]], merged_map: Dict[Tuple[int, int], Tuple[Any, bool]],
+                                row: int, col: int) -> str:
+    """
+    セルの値を処理する（'#' プレフィックスを除去する列用）
     """
-    cell = sheet.cell(row=row, column=col)
+    merged = merged_map.get((row, col))
     
     # 連結セルのチェック
-    if cell.coordinate in sheet.merged_cells:
-        merge_range = next(range for range in sheet.merged_cells.ranges if cell.coordinate in range)
-        if cell.coordinate == merge_range.start_cell.coordinate:
-            value = cell.value
-            if check_prefix and value and isinstance(value, str) and value.startswith('#'):
+    if merged is not None:
+        anchor_value, is_anchor = merged
+        if is_anchor:
+            value = anchor_value
+            if value and isinstance(value, str) and value.startswith('#'):
                 value = value[1:]  # #を除去
             return value
         else:
             return '<'
     
     # 通常のセル
-    value = cell.value
-    if check_prefix and value and isinstance(value, str) and value.startswith('#'):
+    value = grid[row - 1][col - 1]
+    if value and isinstance(value, str) and value.startswith('#'):
         value = value[1:]  # #を除去
+    # 文字列セルはそのまま返し、数値などの場合のみ str() で変換する
+    if isinstance(value, str):
+        return value
     return str(value) if value is not None else ''
 
-def write_csv(filename: str, data: List[List[str]]) -> None:
+def write_csv(filename: str, data: Iterable[List[str]]) -> None:
     """
     データをCSVファイルに書き出す
     """
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
+    with open(filename, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
         writer = csv.writer(f)
         writer.writerows(data)
 
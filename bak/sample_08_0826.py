@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from enum import Enum, auto
+from functools import lru_cache
+from itertools import cycle
 import csv
 import json
+import logging
 import sys
 from abc import ABC, abstractmethod
 from pathlib import Path
 
+# 構造解析の経過はデバッグログとして出力する（通常は出力しない）
+logger = logging.getLogger(__name__)
+
 # 基本的な型定義
 class CellType(Enum):
     ARRAY = auto()
@@ -16,20 +21,20 @@ class CellType(Enum):
     LAYOUT_MARKER = auto()
     EMPTY = auto()
 
-@dataclass
-class Position:
-    row: int
-    col: int
-
-    def right(self) -> 'Position':
-        return Position(self.row, self.col + 1)
-    
-    def down(self) -> 'Position':
-        return Position(self.row + 1, self.col)
+# 値だけで種別が決まるセル（それ以外は末尾の '[]' で配列/プリミティブを判定）
+_FIXED_TYPES = {
+    '': CellType.EMPTY,
+    '<': CellType.LAYOUT_MARKER,
+    'LAYOUT': CellType.EMPTY,
+    'DATA': CellType.EMPTY,
+}
 
 # データホルダー関連のクラス
 class DataHolder(ABC):
     """データを保持する基底クラス"""
+    # セル・ホルダーは大量に生成されるため、各クラスとも __slots__ で属性を固定する
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         self.name = name
     
@@ -43,33 +48,44 @@ class DataHolder(ABC):
 
 class PrimitiveHolder(DataHolder):
     """プリミティブな値を保持するクラス"""
+    __slots__ = ('value',)
+
     def __init__(self, name: str):
         super().__init__(name)
         self.value = None
     
     def accept_data(self, data: str) -> None:
+        self.value = self._convert(data)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)  # 同じ文字列の変換結果を使い回す（件数に上限を設ける）
+    def _convert(data: str) -> Any:
+        """セル文字列を bool / int / float / 文字列 / None に変換する"""
         if not data or data.isspace():
-            self.value = None
-            return
+            return None
 
         data = data.strip()
         if data.startswith('*'):
             data = data[1:]
 
-        if data.lower() == 'true':
-            self.value = True
-        elif data.lower() == 'false':
-            self.value = False
-        elif data.replace('.', '').isdigit():
-            self.value = float(data) if '.' in data else int(data)
-        else:
-            self.value = data
+        lowered = data.lower()
+        if lowered == 'true':
+            return True
+        elif lowered == 'false':
+            return False
+        elif data.isdigit():
+            return int(data)
+        elif '.' in data and data.replace('.', '').isdigit():
+            return float(data)
+        return data
     
     def to_dict(self) -> Any:
         return self.value
 
 class ArrayHolder(DataHolder):
     """配列を保持するクラス"""
+    __slots__ = ('element_type', 'elements', 'current_element')
+
     def __init__(self, name: str, element_type: 'StructureElement'):
         super().__init__(name)
         self.element_type = element_type
@@ -87,12 +103,16 @@ class ArrayHolder(DataHolder):
 
 class ObjectHolder(DataHolder):
     """オブジェクトを保持するクラス"""
+    __slots__ = ('fields', '_field_items', 'current_field')
+
     def __init__(self, name: str, field_types: Dict[str, 'StructureElement']):
         super().__init__(name)
         self.fields: Dict[str, DataHolder] = {
             name: field_type.create_data_holder()
             for name, field_type in field_types.items()
         }
+        # フィールド構成は生成後に変わらないため、(名前, ホルダー) の組を固定しておく
+        self._field_items = tuple(self.fields.items())
         self.current_field = None
     
     def accept_data(self, data: str) -> None:
@@ -105,19 +125,27 @@ class ObjectHolder(DataHolder):
     def to_dict(self) -> Dict[str, Any]:
         return {
             name: holder.to_dict()
-            for name, holder in self.fields.items()
+            for name, holder in self._field_items
         }
 
 # 構造要素関連のクラス
 class StructureElement(ABC):
     """構造を表現する基底クラス"""
     def __init__(self, name: str):
-        self.name = name
+        # フィールド名は辞書キーとして繰り返し使うためインターンしておく
+        self.name = sys.intern(name)
     
     @abstractmethod
     def create_data_holder(self):
         pass
 
+    def compile_plan(self) -> List[Tuple[Tuple[str, ...], bool]]:
+        """
+        データ行のセルを受け取る葉要素を並び順に列挙する。
+        各要素は (ルートからのフィールド名のパス, 配列かどうか) の組。
+        """
+        return [((), False)]
+
 class PrimitiveElement(StructureElement):
     """プリミティブな値を表現する構造要素"""
     def create_data_holder(self):
@@ -132,6 +160,10 @@ class ArrayElement(StructureElement):
     def create_data_holder(self):
         return ArrayHolder(self.name, self.element_type)
 
+    def compile_plan(self) -> List[Tuple[Tuple[str, ...], bool]]:
+        # 配列は1セルで1要素分のデータを受け取る
+        return [((), True)]
+
 class ObjectElement(StructureElement):
     """オブジェクトを表現する構造要素"""
     def __init__(self, name: str, fields: Dict[str, StructureElement]):
@@ -141,98 +173,110 @@ class ObjectElement(StructureElement):
     def create_data_holder(self):
         return ObjectHolder(self.name, self.fields)
 
+    def compile_plan(self) -> List[Tuple[Tuple[str, ...], bool]]:
+        return [
+            ((name,) + path, is_array)
+            for name, field in self.fields.items()
+            for path, is_array in field.compile_plan()
+        ]
+
 # レイアウト解析関連のクラス
 class LayoutCell:
     """レイアウトのセルを表現するクラス"""
-    def __init__(self, value: str, position: Position, layout_grid: 'LayoutGrid'):
-        self.value = value.strip()
-        self.position = position
+    __slots__ = ('value', 'row', 'col', 'grid', 'cell_type', 'processed')
+
+    def __init__(self, value: str, row: int, col: int, layout_grid: 'LayoutGrid'):
+        self.value = sys.intern(value.strip())
+        self.row = row
+        self.col = col
         self.grid = layout_grid
         self.cell_type = self._determine_type()
         self.processed = False
     
     def _determine_type(self) -> CellType:
-        if not self.value:
-            return CellType.EMPTY
-        if self.value == '<':
-            return CellType.LAYOUT_MARKER
+        cell_type = _FIXED_TYPES.get(self.value)
+        if cell_type is not None:
+            return cell_type
         if self.value.endswith('[]'):
             return CellType.ARRAY
-        if self.value in {'LAYOUT', 'DATA'}:
-            return CellType.EMPTY
         return CellType.PRIMITIVE
 
     def get_right_cell(self) -> Optional['LayoutCell']:
-        return self.grid.get_cell(self.position.right())
+        return self.grid.get_cell(self.row, self.col + 1)
 
     def get_down_cell(self) -> Optional['LayoutCell']:
-        return self.grid.get_cell(self.position.down())
+        return self.grid.get_cell(self.row + 1, self.col)
 
     def get_left_cell(self) -> Optional['LayoutCell']:
-        return self.grid.get_cell(Position(self.position.row, self.position.col - 1))
+        return self.grid.get_cell(self.row, self.col - 1)
 
     def get_up_cell(self) -> Optional['LayoutCell']:
-        return self.grid.get_cell(Position(self.position.row - 1, self.position.col))
+        return self.grid.get_cell(self.row - 1, self.col)
 
     def investigate_structure(self) -> Optional[StructureElement]:
         if self.processed or self.cell_type == CellType.EMPTY:
             return None
 
-        print(f"\n▼ セル「{self.value}」({self.cell_type.name})の解析開始")
-        print("  └ 処理済みフラグ: {self.processed}")
+        logger.debug("▼ セル「%s」(%s)の解析開始", self.value, self.cell_type.name)
+        logger.debug("  └ 処理済みフラグ: %s", self.processed)
         self.processed = True
 
         if self.cell_type == CellType.ARRAY:
             # Step 1: 配列セルの場合、即座に下方向の解析を実行
-            print("  ├ Step 1: 下方向の構造解析")
-            down_cell = self.get_down_cell()
+            logger.debug("  ├ Step 1: 下方向の構造解析")
+            # 空セルは座標を持たない共有インスタンスのため、走査は座標で進める
+            down_row = self.row + 1
+            down_cell = self.grid.get_cell(down_row, self.col)
             vertical_fields = {}
             
             while down_cell:
                 if down_cell.cell_type == CellType.EMPTY:
-                    print("  │   └ 空行をスキップ")
+                    logger.debug("  │   └ 空行をスキップ")
                 else:
-                    print(f"  │   └ フィールドを検出: {down_cell.value} ({down_cell.cell_type.name})")
+                    logger.debug("  │   └ フィールドを検出: %s (%s)", down_cell.value, down_cell.cell_type.name)
                     if not down_cell.processed:
                         element = down_cell.investigate_structure()
                         if element:
                             vertical_fields[element.name] = element
-                            print(f"  │     └ 要素を追加: {element.name}")
-                down_cell = down_cell.get_down_cell()
+                            logger.debug("  │     └ 要素を追加: %s", element.name)
+                down_row += 1
+                down_cell = self.grid.get_cell(down_row, self.col)
             
-            print("  │   └ 下方向の解析完了")
+            logger.debug("  │   └ 下方向の解析完了")
             
             # Step 2: 横方向の解析
-            print("  ├ Step 2: 横方向の解析")
+            logger.debug("  ├ Step 2: 横方向の解析")
             right_cell = self.get_right_cell()
             
             if right_cell and right_cell.cell_type == CellType.LAYOUT_MARKER:
                 return self._investigate_array(right_cell, vertical_fields)
             else:
-                print("  │ └ プリミティブ配列として処理")
+                logger.debug("  │ └ プリミティブ配列として処理")
                 return ArrayElement(self.value[:-2], PrimitiveElement(f"{self.value[:-2]}_item"))
 
         elif self.cell_type == CellType.LAYOUT_MARKER:
             # レイアウトマーカーの処理は変更なし
-            print("  ├ Step 1: 左方向に形式定義を探索")
-            left_cell = self.get_left_cell()
+            logger.debug("  ├ Step 1: 左方向に形式定義を探索")
+            left_col = self.col - 1
+            left_cell = self.grid.get_cell(self.row, left_col)
             while left_cell and left_cell.cell_type == CellType.EMPTY:
-                print("  │   └ 空セルをスキップ")
-                left_cell = left_cell.get_left_cell()
+                logger.debug("  │   └ 空セルをスキップ")
+                left_col -= 1
+                left_cell = self.grid.get_cell(self.row, left_col)
             
             if left_cell and left_cell.cell_type == CellType.ARRAY:
-                print(f"  │   └ 形式定義を発見: {left_cell.value}")
+                logger.debug("  │   └ 形式定義を発見: %s", left_cell.value)
                 return left_cell.investigate_structure()
         
         elif self.cell_type == CellType.PRIMITIVE:
-            print("  └ プリミティブ要素として処理")
+            logger.debug("  └ プリミティブ要素として処理")
             return PrimitiveElement(self.value)
         
         return None
 
     def _investigate_array(self, marker_cell: 'LayoutCell', vertical_fields: Dict[str, StructureElement]) -> ArrayElement:
         base_name = self.value[:-2]
-        print("  │ └ 右セルがレイアウトマーカー(<)のため、同じキーとして処理")
+        logger.debug("  │ └ 右セルがレイアウトマーカー(<)のため、同じキーとして処理")
         
         # 連続するマーカーを数える
         marker_count = 1
@@ -243,158 +287,173 @@ class LayoutCell:
             marker_count += 1
             current_marker = next_cell
             next_cell = current_marker.get_right_cell()
-            print(f"  │   └ {marker_count}個目のレイアウトマーカーを検出")
+            logger.debug("  │   └ %s個目のレイアウトマーカーを検出", marker_count)
         
-        print(f"  │   └ 合計{marker_count}個のレイアウトマーカーでネスト")
+        logger.debug("  │   └ 合計%s個のレイアウトマーカーでネスト", marker_count)
         
         # 横方向のフィールドを追加
         fields = vertical_fields.copy()  # 縦方向で見つかったフィールドを基にする
-        current_cell = current_marker.get_right_cell()
+        current_col = current_marker.col + 1
+        current_cell = self.grid.get_cell(self.row, current_col)
         
         while current_cell and not current_cell.processed:
             if current_cell.cell_type != CellType.EMPTY:
-                print(f"    └ 配列内フィールド検出: {current_cell.value}")
+                logger.debug("    └ 配列内フィールド検出: %s", current_cell.value)
                 element = current_cell.investigate_structure()
                 if element:
                     fields[element.name] = element
-            current_cell = current_cell.get_right_cell()
+            current_col += 1
+            current_cell = self.grid.get_cell(self.row, current_col)
         
         return ArrayElement(base_name, ObjectElement(f"{base_name}_item", fields))
 
+# 空セルは全位置で共有する（座標・グリッドを持たず、解析でも状態が変わらない）
+_EMPTY_CELL = LayoutCell.__new__(LayoutCell)
+_EMPTY_CELL.value = ''
+_EMPTY_CELL.row = None
+_EMPTY_CELL.col = None
+_EMPTY_CELL.grid = None
+_EMPTY_CELL.cell_type = CellType.EMPTY
+_EMPTY_CELL.processed = False
+
 class LayoutGrid:
     """レイアウトグリッド全体を管理するクラス"""
     def __init__(self, layout_rows: List[List[str]]):
-        self.grid: List[List[LayoutCell]] = []
+        # セルは行優先で1次元リストに保持し、row * ncols + col で参照する
+        self.cells: List[LayoutCell] = []
+        self.nrows = 0
+        self.ncols = 0
         self._build_grid(layout_rows)
 
     def _build_grid(self, layout_rows: List[List[str]]):
+        # 列数は先頭行の幅に合わせ、短い行は空セルで補完する
+        self.nrows = len(layout_rows)
+        self.ncols = len(layout_rows[0]) if layout_rows else 0
         for row_idx, row in enumerate(layout_rows):
-            grid_row = []
-            for col_idx, value in enumerate(row):
-                pos = Position(row_idx, col_idx)
-                cell = LayoutCell(value, pos, self)
-                grid_row.append(cell)
-            self.grid.append(grid_row)
+            for col_idx in range(self.ncols):
+                value = row[col_idx] if col_idx < len(row) else ''
+                if not value or value.isspace():
+                    self.cells.append(_EMPTY_CELL)
+                else:
+                    self.cells.append(LayoutCell(value, row_idx, col_idx, self))
 
-    def get_cell(self, pos: Position) -> Optional[LayoutCell]:
-        if 0 <= pos.row < len(self.grid) and 0 <= pos.col < len(self.grid[0]):
-            return self.grid[pos.row][pos.col]
+    def get_cell(self, row: int, col: int) -> Optional[LayoutCell]:
+        if 0 <= row < self.nrows and 0 <= col < self.ncols:
+            return self.cells[row * self.ncols + col]
         return None
 
     def analyze_structure(self) -> StructureElement:
         fields = {}
         start_col = 2
-        current_cell = self.get_cell(Position(0, start_col))
         
-        while current_cell:
+        # 先頭行は連続しているのでスライスで走査する
+        for current_cell in self.cells[start_col:self.ncols]:
             if current_cell.cell_type != CellType.EMPTY:
                 element = current_cell.investigate_structure()
                 if element:
                     fields[element.name] = element
-            current_cell = current_cell.get_right_cell()
         
         return ObjectElement("root", fields)
 
 # データ処理関連のクラス
 class DataRowCell:
     """データ行のセルを表現するクラス"""
-    def __init__(self, value: str, position: Position, data_grid: 'DataGrid'):
+    __slots__ = ('value', 'row', 'col', 'grid', 'is_continuation')
+
+    def __init__(self, value: str, row: int, col: int, data_grid: 'DataGrid'):
         self.value = value.strip()
-        self.position = position
+        self.row = row
+        self.col = col
         self.grid = data_grid
         self.is_continuation = bool(value.startswith('*'))
     
     def get_right_cell(self) -> Optional['DataRowCell']:
-        return self.grid.get_cell(self.position.right())
+        return self.grid.get_cell(self.row, self.col + 1)
 
 class DataGrid:
     """データグリッド全体を管理するクラス"""
     def __init__(self, data_rows: List[List[str]], structure: StructureElement):
         self.grid: List[List[DataRowCell]] = []
         self.structure = structure
+        # 構造は固定なので、セルの割り当て先とレコード生成関数は最初に一度だけ求めておく
+        # （プロトタイプの deepcopy はコンストラクタ呼び出しより大幅に遅いため使わない）
+        self._plan = structure.compile_plan()
+        self._create_holder = structure.create_data_holder
+        self.nrows = 0
+        self.ncols = 0
         self._build_grid(data_rows)
     
     def _build_grid(self, data_rows: List[List[str]]):
         for row_idx, row in enumerate(data_rows):
             grid_row = []
             for col_idx, value in enumerate(row):
-                pos = Position(row_idx, col_idx)
-                cell = DataRowCell(value, pos, self)
+                cell = DataRowCell(value, row_idx, col_idx, self)
                 grid_row.append(cell)
             self.grid.append(grid_row)
+        self.nrows = len(self.grid)
+        self.ncols = len(self.grid[0]) if self.grid else 0
     
-    def get_cell(self, pos: Position) -> Optional[DataRowCell]:
-        if 0 <= pos.row < len(self.grid) and 0 <= pos.col < len(self.grid[0]):
-            return self.grid[pos.row][pos.col]
+    def get_cell(self, row: int, col: int) -> Optional[DataRowCell]:
+        if 0 <= row < self.nrows and 0 <= col < self.ncols:
+            return self.grid[row][col]
         return None
     
     def parse_data(self) -> List[DataHolder]:
         result = []
         current_holder = None
+        current_leaves = []
         
         for row in self.grid:
             if not row[1].value.strip():
                 if current_holder:
                     result.append(current_holder)
-                current_holder = self.structure.create_data_holder()
-                self._process_data_row(current_holder, row)
+                current_holder = self._create_holder()
+                current_leaves = self._resolve_plan(current_holder)
+                self._process_data_row(current_leaves, row)
             else:
                 if current_holder:
-                    self._process_data_row(current_holder, row)
+                    self._process_data_row(current_leaves, row)
         
         if current_holder:
             result.append(current_holder)
         
         return result
     
-    def _process_data_row(self, holder: DataHolder, row: List[DataRowCell]):
+    def _resolve_plan(self, holder: DataHolder) -> List[Tuple[Callable[[str], None], Optional[ArrayHolder]]]:
+        """
+        割り当て計画のパスを、レコードのホルダーの実体に解決する。
+        各要素は (accept_data の束縛メソッド, 配列の場合はそのホルダー／それ以外は None)。
+        """
+        leaves = []
+        for path, is_array in self._plan:
+            h = holder
+            for name in path:
+                h = h.fields[name]
+            leaves.append((h.accept_data, h if is_array else None))
+        return leaves
+    
+    def _process_data_row(self, leaves: List[Tuple[Callable[[str], None], Optional[ArrayHolder]]], row: List[DataRowCell]):
+        if not leaves:
+            return
         start_col = 2
-        current_cell = row[start_col]
-        current_field_idx = 0
-        
-        def process_holder(h: DataHolder, cell: DataRowCell) -> int:
-            nonlocal current_field_idx
-            
-            if isinstance(h, ObjectHolder):
-                fields = list(h.fields.items())
-                processed_count = 0
-                while current_field_idx < len(fields) and cell:
-                    field_name, field_holder = fields[current_field_idx]
-                    count = process_holder(field_holder, cell)
-                    for _ in range(count):
-                        cell = cell.get_right_cell() if cell else None
-                    processed_count += count
-                    current_field_idx += 1
-                return processed_count
-            
-            elif isinstance(h, ArrayHolder):
-                if cell.is_continuation or not h.current_element:
-                    h.accept_data(cell.value)
-                return 1
-            
-            else:  # PrimitiveHolder
-                h.accept_data(cell.value)
-                return 1
-        
-        while current_cell:
-            current_field_idx = 0
-            cells_processed = process_holder(holder, current_cell)
-            for _ in range(cells_processed):
-                current_cell = current_cell.get_right_cell()
+        # フィールド数より多いセルは、先頭のフィールドから順に再度割り当てる
+        for (accept, array_holder), cell in zip(cycle(leaves), row[start_col:self.ncols]):
+            if array_holder is None or cell.is_continuation or not array_holder.current_element:
+                accept(cell.value)
 
 def convert_csv_file_to_json(input_path: str, output_path: str) -> None:
     """CSVファイルを読み込んでJSONファイルに変換"""
-    # CSVファイルを読み込む
-    with open(input_path, 'r', encoding='utf-8') as f:
-        csv_content = f.read()
-    
-    # CSVを解析
-    reader = csv.reader(csv_content.splitlines())
-    rows = list(reader)
-    
-    # レイアウト行とデータ行を分離
-    layout_rows = [row for row in rows if row[0] == 'LAYOUT']
-    data_rows = [row for row in rows if row[0] == 'DATA']
+    # CSVファイルを読み込みながら、レイアウト行とデータ行を1回の走査で分離
+    layout_rows = []
+    data_rows = []
+    with open(input_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            if row[0] == 'LAYOUT':
+                layout_rows.append(row)
+            elif row[0] == 'DATA':
+                data_rows.append(row)
     
     # 構造を解析
     grid = LayoutGrid(layout_rows)
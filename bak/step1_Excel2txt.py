@@ -2,15 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import sys
+from operator import itemgetter
 from openpyxl import load_workbook
 
-def get_target_columns(sheet):
+def get_target_columns(rows):
     """
-    シート内の HEAD 行から、3列目以降で先頭が '#' もしくは '[' のセルがある列（1-indexed）を収集。
+    シートの行データ内の HEAD 行から、3列目以降で先頭が '#' もしくは '[' のセルがある列（1-indexed）を収集。
     さらに1列目、2列目は必ず対象とする。
     """
     target_cols = set()
-    for row in sheet.iter_rows(values_only=True):
+    for row in rows:
         if not row:
             continue
         if row[0] == "HEAD":
@@ -25,34 +26,46 @@ def get_target_columns(sheet):
     target_cols.add(2)
     return sorted(target_cols)
 
-def format_head_row(row, target_cols):
+def make_column_picker(target_cols):
+    """
+    行から target_cols の列の値だけを1回の itemgetter 呼び出しでタプルとして取り出す関数を返す。
+    行の長さが足りない場合は None で補完する。
+    ※ target_cols は1,2列目を必ず含むため、戻り値は常にタプルになる。
+    """
+    getter = itemgetter(*(col - 1 for col in target_cols))
+    width = max(target_cols)
+
+    def pick(row):
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        return getter(row)
+    return pick
+
+def format_head_row(values, target_cols):
     """
     HEAD行の場合、3列目以降で先頭が '#' の場合は除去して出力用のリストを作る。
+    values は target_cols の各列の値（make_column_picker で取り出したもの）。
     """
     out_fields = []
-    for col in target_cols:
-        # 列番号は1-indexed、Pythonではcol-1
-        val = row[col-1] if col-1 < len(row) else ""
-        if col >= 3 and val is not None:
-            s = str(val)
-            if s.startswith("#"):
-                s = s[1:]
-            out_fields.append(s)
-        else:
-            out_fields.append("" if val is None else str(val))
+    for col, val in zip(target_cols, values):
+        if val is None:
+            out_fields.append("")
+            continue
+        s = str(val)
+        if col >= 3 and s.startswith("#"):
+            s = s[1:]
+        out_fields.append(s)
     return out_fields
 
-def format_data_row(row, target_cols, force_first=False):
+def format_data_row(values, target_cols, force_first=False):
     """
     DATA系の行の場合、force_first が True のときは1列目を "DATA" に強制する
+    values は target_cols の各列の値（make_column_picker で取り出したもの）。
     """
-    out_fields = []
-    for col in target_cols:
-        if force_first and col == 1:
-            out_fields.append("DATA")
-        else:
-            val = row[col-1] if col-1 < len(row) else ""
-            out_fields.append("" if val is None else str(val))
+    out_fields = ["" if val is None else str(val) for val in values]
+    if force_first:
+        # target_cols は昇順で1列目を必ず含むため、先頭要素が1列目
+        out_fields[0] = "DATA"
     return out_fields
 
 def main():
@@ -64,8 +77,9 @@ def main():
     specified_sheet = sys.argv[2] if len(sys.argv) > 2 else None
 
     # Excelファイルを読み込み（計算結果など data_only=True で取得）
+    # 行を先頭から順に読むだけなので read_only でストリーミング読み込みする
     try:
-        wb = load_workbook(excel_file, data_only=True)
+        wb = load_workbook(excel_file, data_only=True, read_only=True)
     except Exception as e:
         sys.exit("Excelファイルの読み込みに失敗しました: {}".format(e))
 
@@ -85,8 +99,13 @@ def main():
             else:
                 sys.exit("複数シートありますが、デフォルトの 'HEAD' シートが見つかりません。")
 
+    # シートの走査は1回だけにし、値を保持してからブックを閉じる
+    rows = list(sheet.iter_rows(values_only=True))
+    wb.close()
+
     # 出力対象の列をHEAD行から決定
-    target_cols = get_target_columns(sheet)
+    target_cols = get_target_columns(rows)
+    pick = make_column_picker(target_cols)
     # ※ 出力する列番号（1-indexed）の一覧例: [1, 2, 5, 7] など
 
     output_file = excel_file.rsplit(".", 1)[0] + ".txt"
@@ -96,9 +115,10 @@ def main():
         sys.exit("出力ファイルのオープンに失敗しました: {}".format(e))
 
     in_data_block = False  # DATA_START ～ DATA_END ブロック内かどうか
+    out_lines = []  # 出力行はまとめて最後に1回で書き込む
 
     # シートの全行を処理
-    for row in sheet.iter_rows(values_only=True):
+    for row in rows:
         if not row:
             continue
         cell_a = row[0]  # 1列目の値
@@ -107,18 +127,18 @@ def main():
 
         if cell_a == "HEAD":
             # HEAD行は対象。出力時は3列目以降で先頭 '#' があれば除去
-            out_fields = format_head_row(row, target_cols)
-            fout.write("\t".join(out_fields) + "\n")
+            out_fields = format_head_row(pick(row), target_cols)
+            out_lines.append("\t".join(out_fields) + "\n")
         elif cell_a == "DATA":
             # DATA行はそのまま出力
-            out_fields = format_data_row(row, target_cols)
-            fout.write("\t".join(out_fields) + "\n")
+            out_fields = format_data_row(pick(row), target_cols)
+            out_lines.append("\t".join(out_fields) + "\n")
         elif cell_a == "DATA_START":
             # DATA_START行～DATA_END行または最終行までをひとまとめに対象とする
             in_data_block = True
             # DATA_START行も出力。1列目は強制的に "DATA" にする
-            out_fields = format_data_row(row, target_cols, force_first=True)
-            fout.write("\t".join(out_fields) + "\n")
+            out_fields = format_data_row(pick(row), target_cols, force_first=True)
+            out_lines.append("\t".join(out_fields) + "\n")
         elif cell_a == "DATA_END":
             # DATA_END はブロックの終了。出力せずフラグを下ろす
             in_data_block = False
@@ -128,9 +148,10 @@ def main():
         else:
             # もし DATA_START ブロック内であれば、DATA_ENDに達する前の行が対象
             if in_data_block:
-                out_fields = format_data_row(row, target_cols, force_first=True)
-                fout.write("\t".join(out_fields) + "\n")
+                out_fields = format_data_row(pick(row), target_cols, force_first=True)
+                out_lines.append("\t".join(out_fields) + "\n")
             # それ以外は対象外
+    fout.write("".join(out_lines))
     fout.close()
     print("出力完了: {}".format(output_file))
 
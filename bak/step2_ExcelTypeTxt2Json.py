@@ -1,28 +1,76 @@
 import json
-from typing import Dict, List, Any
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple
 import yaml
 import sys
 
+# libyaml の C 実装が使える場合はそちらで YAML を出力する
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で出力する
+    orjson = None
+
+# コンパイル済みパス: 各トークンを (配列かどうか, キー名) に変換したタプル
+CompiledPath = Tuple[Tuple[bool, str], ...]
+
+# 型変換テーブルに存在しないことを表す番兵
+_MISSING = object()
+
+
+def _ensure_index(lst: List[Any], index: int) -> None:
+    """
+    lst[index] が参照できるよう、不足分の空オブジェクトをまとめて追加する
+    """
+    missing = index + 1 - len(lst)
+    if missing > 0:
+        lst.extend([{} for _ in range(missing)])
+
+
+def _fit_row(row: List[str], width: int) -> List[str]:
+    """
+    行を width 列ちょうどに揃える（不足分は空文字で補い、超過分は切り捨てる）
+    """
+    missing = width - len(row)
+    if missing > 0:
+        return row + [''] * missing
+    if missing < 0:
+        return row[:width]
+    return row
+
 
 class StructureParser:
+    # TRUE / FALSE 文字列の変換テーブル
+    _BOOL_MAP = {"TRUE": True, "FALSE": False}
+
     def __init__(self):
         self.result = {}
         self.column_paths = []
+        self.compiled_paths: List[CompiledPath] = []
+        # 列番号 → (パス, 親パス, 末尾トークン)。DATA行の処理前に一度だけ作成する
+        self._column_plan: Dict[int, Tuple[CompiledPath, CompiledPath, str]] = {}
         self.data_lines = []
 
     def parse_file(self, filename: str) -> None:
+        # 読み込みと同時にHEAD/DATA行を振り分ける（中間リストを作らず1パスで処理）
+        process_head_line = self.process_head_line
+        append_data_line = self.data_lines.append
         with open(filename, 'r', encoding='utf-8') as f:
-            lines = [line.strip().split('\t') for line in f if line.strip()]
-            
-        # HEADとDATA行を分けて処理
-        for line in lines:
-            if not line:
-                continue
-            if line[0] == 'HEAD':
-                self.process_head_line(line)
-            elif line[0] == 'DATA':
-                self.data_lines.append(line)
-        
+            for raw_line in f:
+                stripped = raw_line.strip()
+                if not stripped:
+                    continue
+                line = stripped.split('\t')
+                tag = line[0]
+                if tag == 'HEAD':
+                    process_head_line(line)
+                elif tag == 'DATA':
+                    append_data_line(line)
+
         # すべてのDATA行をまとめて処理
         self.process_data_lines(self.data_lines)
 
@@ -36,17 +84,23 @@ class StructureParser:
         # 最初のHEAD行の場合、column_pathsを初期化
         if not self.column_paths:
             self.column_paths = [[] for _ in range(len(items) - 2)]  # 最初の2列を除く
+            self.compiled_paths = [() for _ in range(len(items) - 2)]
 
         # 3列目以降の各カラムに対してパスを更新
+        # DATA行の処理で毎回解釈しなくて済むよう、トークンはここで (配列かどうか, キー名) に変換しておく
         for i, value in enumerate(items[2:]):
             if value.strip():  # 空でない値のみ処理
                 self.column_paths[i].append(value)
+                self.compiled_paths[i] += (self.compile_token(value),)
 
     def process_data_lines(self, lines: List[List[str]]) -> None:
         """
         DATA行をグループ化して処理する
         """
+        # HEAD行はすべて処理済みなので、列ごとの処理計画をここで確定させる
+        self._column_plan = self._build_column_plan()
         current_group = []
+        group_width = 0
         
         for line in lines:
             if len(line) < 2:
@@ -57,13 +111,29 @@ class StructureParser:
                     if current_group:  # 既存グループがあれば処理
                         self._process_data_group(current_group)
                     current_group = [line]
+                    group_width = len(line)
                 elif line[1].strip() == '*':  # 継続行
-                    current_group.append(line)
+                    if not current_group:
+                        # グループ開始行より前の継続行は、その行自身がグループ先頭になる
+                        group_width = len(line)
+                    # グループ先頭行の列数に揃えておき、グループ処理側で列数の確認をしなくて済むようにする
+                    current_group.append(_fit_row(line, group_width))
         
         # 最後のグループを処理
         if current_group:
             self._process_data_group(current_group)
 
+    def _build_column_plan(self) -> Dict[int, Tuple[CompiledPath, CompiledPath, str]]:
+        """
+        カラムパスを列番号ごとの (パス, 親パス, 末尾トークン) にまとめる。
+        グループごとに親パスを切り出し直さずに済むよう、HEADから一度だけ作成する。
+        """
+        plan = {}
+        for i, path in enumerate(self.compiled_paths):
+            if path:
+                plan[i + 2] = (path, path[:-1], self.column_paths[i][-1])  # 最初の2列を除いた分をずらす
+        return plan
+
     def parse_array_header(self, header: str) -> str:
         """
         配列ヘッダーから実際のキー名を取得
@@ -72,48 +142,61 @@ class StructureParser:
             return header[2:]
         return header
 
-    def get_array_index(self, index_marker: str) -> int:
+    def compile_token(self, token: str) -> Tuple[bool, str]:
         """
-        配列のインデックスを取得
+        パスのトークンを (配列かどうか, キー名) に事前変換する
         """
-        if not index_marker or index_marker == '*':
-            return 0
-        try:
-            return int(index_marker)
-        except ValueError:
-            return 0
-
-    def set_value_in_path(self, base: Dict[str, Any], path: List[str], array_index: int, value: Any) -> None:
+        return token.startswith('[]'), self.parse_array_header(token)
+
+    def set_value_in_path(self, base: Dict[str, Any], path: CompiledPath, array_index: int, value: Any,
+                          node_cache: Optional[Dict[Tuple[CompiledPath, int], Dict[str, Any]]] = None) -> None:
         """
         パスに沿ってオブジェクト/配列を辿り、最終的に値を設定する。
+        path は compile_token で変換済みのトークンのタプルを受け取る。
         path 内に "[]xxx" が複数含まれる場合、それぞれ配列として扱うが、
         最初の配列だけに対して `array_index` を適用し、2つ目以降の配列は「最後の要素を使う／無ければ新規作成」する。
+        node_cache を渡した場合、(親パス, array_index) ごとに辿り着いたノードを記録し、次回以降は再利用する。
         """
         # TRUE / FALSE / 数字 などの文字列をPythonの型に変換
-        if value == "TRUE":
-            value = True
-        elif value == "FALSE":
-            value = False
+        value = self._coerce_value(value)
+
+        parent_path = path[:-1]
+        if node_cache is None:
+            current = self._resolve_node(base, parent_path, array_index)
+        else:
+            cache_key = (parent_path, array_index)
+            current = node_cache.get(cache_key)
+            if current is None:
+                current = node_cache[cache_key] = self._resolve_node(base, parent_path, array_index)
+
+        # 最後の要素（末尾のキー）に対して値を設定
+        is_array, key = path[-1]
+        if is_array:
+            # 最終キーも配列の場合
+            if key not in current:
+                current[key] = []
+            # 最終キーが配列の場合は、その配列に「値」を1つ append する想定
+            current[key].append(value)
         else:
-            # 整数文字列を int 化 (純粋な数字の場合のみ)
-            if value.isdigit():
-                value = int(value)
+            # 通常キー
+            current[key] = value
 
+    def _resolve_node(self, base: Dict[str, Any], parent_path: CompiledPath, array_index: int) -> Dict[str, Any]:
+        """
+        親パスに沿ってノードを辿り（無ければ作成し）、値を設定する直前のノードを返す
+        """
         current = base
         used_array_index = False  # 最初に見つかった配列に対してのみ array_index を適用
 
-        # 最後の要素を除いた部分でノードを辿る
-        for token in path[:-1]:
-            if token.startswith('[]'):
-                # 配列キー
-                key = self.parse_array_header(token)  # '[]xxx' → 'xxx'
+        for is_array, key in parent_path:
+            if is_array:
+                # 配列キー（key は '[]xxx' → 'xxx' 変換済み）
                 if key not in current:
                     current[key] = []
                 # 最初の配列キーだけ array_index を使う
                 if not used_array_index:
                     # 必要数まで拡張
-                    while len(current[key]) <= array_index:
-                        current[key].append({})
+                    _ensure_index(current[key], array_index)
                     current = current[key][array_index]
                     used_array_index = True
                 else:
@@ -123,68 +206,57 @@ class StructureParser:
                     current = current[key][-1]
             else:
                 # 通常キー
-                if token not in current:
-                    current[token] = {}
-                current = current[token]
-
-        # 最後の要素（末尾のキー）に対して値を設定
-        last_token = path[-1]
-        if last_token.startswith('[]'):
-            # 最終キーも配列の場合
-            key = self.parse_array_header(last_token)
-            if key not in current:
-                current[key] = []
-            # 最終キーが配列の場合は、その配列に「値」を1つ append する想定
-            current[key].append(value)
-        else:
-            # 通常キー
-            current[last_token] = value
+                if key not in current:
+                    current[key] = {}
+                current = current[key]
+        return current
 
-    def set_array_values_in_path(self, current: dict, path: List[str], array_index: int, values: List[str]) -> None:
+    def set_array_values_in_path(self, current: dict, path: CompiledPath, array_index: int, values: List[str]) -> None:
         """
         パスに従って複数の値を配列として設定
+        path は compile_token で変換済みのトークンのタプルを受け取る。
         """
         # 前段階のノードに移動
-        for i, token in enumerate(path[:-1]):
-            if token.startswith('[]'):
-                key = self.parse_array_header(token)
+        for is_array, key in path[:-1]:
+            if is_array:
                 if key not in current:
                     current[key] = []
                 # array_index を使う（最初の [] だけ有効にするなら工夫が必要）
-                if array_index >= len(current[key]):
-                    current[key].append({})
+                _ensure_index(current[key], array_index)
                 current = current[key][array_index]
             else:
-                if token not in current:
-                    current[token] = {}
-                current = current[token]
+                if key not in current:
+                    current[key] = {}
+                current = current[key]
 
-        last_token = path[-1]
-        if last_token.startswith('[]'):
-            key = self.parse_array_header(last_token)
+        is_array, key = path[-1]
+        if is_array:
             if key not in current:
                 current[key] = []
             # 配列に extend
             current[key].extend(self._convert_values(values))
         else:
             # 単なるリストを直接突っ込む
-            current[last_token] = self._convert_values(values)
+            current[key] = self._convert_values(values)
 
     def _convert_values(self, values: List[str]) -> List[Any]:
         """
         TRUE/FALSE/数字 などを適切に変換したリストを返す
         """
-        converted = []
-        for v in values:
-            if v == "TRUE":
-                converted.append(True)
-            elif v == "FALSE":
-                converted.append(False)
-            elif v.isdigit():
-                converted.append(int(v))
-            else:
-                converted.append(v)
-        return converted
+        coerce = self._coerce_value
+        return [coerce(v) for v in values]
+
+    def _coerce_value(self, value: str) -> Any:
+        """
+        TRUE/FALSE は bool に、純粋な数字は int に変換する
+        """
+        coerced = self._BOOL_MAP.get(value, _MISSING)
+        if coerced is not _MISSING:
+            return coerced
+        # 整数文字列を int 化 (純粋な数字の場合のみ)
+        if value.isdigit():
+            return int(value)
+        return value
 
     def _process_data_group(self, group: List[List[str]]) -> None:
         """
@@ -195,32 +267,32 @@ class StructureParser:
 
         # 3列目以降の値を列ごとに集める
         # column_values[col_idx] = [値1, 値2, ...]
+        # グループを列方向に転置し、列ごとに空でない値だけを取り出す
+        # （各行は process_data_lines で先頭行と同じ列数に揃えてある）
         column_values = {}
-        for col_idx in range(2, len(group[0])):  # 2列目までは無視
-            vals = []
-            for row in group:
-                if col_idx < len(row):
-                    v = row[col_idx].strip()
-                    if v:
-                        vals.append(v)
+        for col_idx, column in enumerate(islice(zip(*group), 2, None), start=2):  # 2列目までは無視
+            # 全セルが空文字の列は strip するまでもないので、C レベルの any() で先に除外する
+            if not any(column):
+                continue
+            vals = [v for v in map(str.strip, column) if v]
             if vals:
                 column_values[col_idx] = vals
 
         # まず、同じ「親パス」を共有する列をグループ化する
         # 親パス: column_paths[col_idx - 2] のうち、最後のトークンを除いた部分
+        column_plan = self._column_plan
         parent_path_map = {}
-        for col_idx, _ in column_values.items():
-            if (col_idx - 2) < len(self.column_paths):
-                full_path = self.column_paths[col_idx - 2]
-                if full_path:
-                    parent = tuple(full_path[:-1])  # 親パス
-                    last_token = full_path[-1]
-                    if parent not in parent_path_map:
-                        parent_path_map[parent] = []
-                    parent_path_map[parent].append((col_idx, last_token))
+        for col_idx in column_values:
+            plan = column_plan.get(col_idx)
+            if plan is not None:
+                _, parent, last_token = plan
+                if parent not in parent_path_map:
+                    parent_path_map[parent] = []
+                parent_path_map[parent].append((col_idx, last_token))
 
         # 実際に処理する
-        array_index = self.get_array_index('')  # とりあえず最初のDATA行は空欄として0固定
+        coerce = self._coerce_value
+        array_index = 0  # 最初のDATA行のインデックス欄は常に空欄なので0固定
         processed_columns = set()  # 特別処理で使い終わった列は通常処理しない
 
         for parent, cols_info in parent_path_map.items():
@@ -232,8 +304,8 @@ class StructureParser:
                 continue  # 親パスがない場合はスキップ
             
             # 親パスの末尾が配列キーなら…という簡易判定
-            parent_last_token = parent[-1]
-            if not parent_last_token.startswith('[]'):
+            parent_last_is_array, parent_array_key = parent[-1]
+            if not parent_last_is_array:
                 continue
 
             # cols_info の例: [ (col_idx, "field"), (col_idx, "type"), (col_idx, "value") ]
@@ -245,38 +317,11 @@ class StructureParser:
             # group の各行について、cols_info の各列に値があれば、それらを { last_token: 値 } としてまとめる
             # まとめたオブジェクトを parent パスの配列に append する
 
-            # 親パスをリスト化
-            parent_list = list(parent)
             # parent の最後のトークン (例: "[]rule") は実際の追加先配列
-            parent_array_key = self.parse_array_header(parent_last_token)
             # オブジェクトを追加する先を探す (parent のさらに一つ手前までをたどる)
             # 例: parent = ["[]conditions", "[]rule"] の場合は、["[]conditions"] の最後の要素にある "rule" 配列
-            # ただし、実際には self.set_value_in_path と同じように辿る必要がある
-
-            # まず、「parent の最後のトークンを除いたパス」(= 配列の親の親) に移動する
-            actual_parent_path = parent_list[:-1]  # "[]rule" の手前まで
-            # ここで current を見つける
-            current = self.result
-            used_array_index = False
-            for token in actual_parent_path:
-                if token.startswith('[]'):
-                    k = self.parse_array_header(token)
-                    if k not in current:
-                        current[k] = []
-                    if not used_array_index:
-                        # 必要数だけ拡張
-                        while len(current[k]) <= array_index:
-                            current[k].append({})
-                        current = current[k][array_index]
-                        used_array_index = True
-                    else:
-                        if not current[k]:
-                            current[k].append({})
-                        current = current[k][-1]
-                else:
-                    if token not in current:
-                        current[token] = {}
-                    current = current[token]
+            # set_value_in_path と同じ辿り方なので _resolve_node を使う
+            current = self._resolve_node(self.result, parent[:-1], array_index)
 
             # これで current は "[]rule" の直前のオブジェクト
             # "[]rule" 自体を取得/初期化
@@ -293,13 +338,12 @@ class StructureParser:
                 rule_obj = {}
                 value_found = False
                 for col_idx, last_token in cols_info_sorted:
-                    if col_idx < len(row):
-                        val = row[col_idx].strip()
-                        if val:
-                            # TRUE/FALSE/数字 変換
-                            val_converted = self._convert_values([val])[0]
-                            rule_obj[last_token] = val_converted
-                            value_found = True
+                    val = row[col_idx].strip()
+                    if val:
+                        # TRUE/FALSE/数字 変換
+                        val_converted = coerce(val)
+                        rule_obj[last_token] = val_converted
+                        value_found = True
                 if value_found:
                     # 何らかの値があった場合のみ追加
                     rules_array.append(rule_obj)
@@ -309,28 +353,36 @@ class StructureParser:
                 processed_columns.add(col_idx)
 
         # 上記で特別処理した列以外は、通常の set_value_in_path / set_array_values_in_path へ
+        # 同じ親パスを持つ列は、グループ内で辿ったノードを使い回す
+        node_cache = {}
         for col_idx, values in column_values.items():
             if col_idx in processed_columns:
                 # 既に特別処理した列はスキップ
                 continue
-            if (col_idx - 2) < len(self.column_paths):
-                path = self.column_paths[col_idx - 2]
-                if not path:
-                    continue
-                
-                if len(values) == 1:
-                    # 単一値の場合
-                    self.set_value_in_path(self.result, path, array_index, values[0])
-                else:
-                    # 複数値の場合は配列として設定
-                    self.set_array_values_in_path(self.result, path, array_index, values)
+            plan = column_plan.get(col_idx)
+            if plan is None:
+                continue
+            path = plan[0]
+
+            if len(values) == 1:
+                # 単一値の場合
+                self.set_value_in_path(self.result, path, array_index, values[0], node_cache)
+            else:
+                # 複数値の場合は配列として設定
+                self.set_array_values_in_path(self.result, path, array_index, values)
     def to_json(self) -> str:
         """結果をJSON文字列として返す"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(self.result, option=orjson.OPT_INDENT_2).decode('utf-8')
+            except TypeError:
+                # 64bitを超える整数など orjson で扱えない値は標準の json にまかせる
+                pass
         return json.dumps(self.result, ensure_ascii=False, indent=2)
 
     def to_yaml(self) -> str:
         """結果をYAML文字列として返す"""
-        return yaml.dump(self.result, allow_unicode=True, sort_keys=False)
+        return yaml.dump(self.result, Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
     
 def main():
     # コマンドライン引数の処理
@@ -1,13 +1,19 @@
 import yaml
-import json
 from typing import Any, Optional, Tuple, List
 
+# Use the libyaml C bindings when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
 class LiteralString(str): pass
 
 def literal_presenter(dumper, data):
-    return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
+    # The C emitter only accepts exact str values, not subclasses
+    return dumper.represent_scalar('tag:yaml.org,2002:str', str(data), style='|')
 
-yaml.add_representer(LiteralString, literal_presenter)
+SafeDumper.add_representer(LiteralString, literal_presenter)
 
 def merge_yaml_arrays(yaml_str1: str, yaml_str2: str) -> str:
     """
@@ -26,43 +32,44 @@ def merge_yaml_arrays(yaml_str1: str, yaml_str2: str) -> str:
     """
     try:
         # Parse YAML strings
-        data1 = yaml.full_load(yaml_str1)
-        print(yaml_str1)
-        print(data1)
-        print(yaml.dump(data1, allow_unicode=True))
-        print(json.dumps(data1, indent=2))
-        data2 = yaml.safe_load(yaml_str2)
+        data1 = yaml.load(yaml_str1, Loader=SafeLoader)
+        data2 = yaml.load(yaml_str2, Loader=SafeLoader)
         
-        def find_deepest_array(data: Any, path: Optional[List] = None) -> Optional[Tuple[List, List]]:
+        def find_deepest_array(data: Any) -> Optional[Tuple[List, List]]:
             """
             Find the path to the deepest array in the YAML structure.
             
+            Walks the structure depth-first with an explicit stack and stops at the
+            first array that holds no nested dicts/lists. Each stack entry keeps its
+            path as a linked (key, parent) pair, so the path list is only built once
+            for the array that is found.
+            
             Args:
-                data: Current YAML data structure
-                path: Current path in the structure
+                data: YAML data structure
                 
             Returns:
                 Optional[Tuple[List, List]]: (path to deepest array, the array itself) or None
             """
-            if path is None:
-                path = []
-                
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    new_path = path + [key]
-                    result = find_deepest_array(value, new_path)
-                    if result is not None:
-                        return result
-            elif isinstance(data, list):
-                for i, item in enumerate(data):
-                    new_path = path + [i]
-                    if isinstance(item, (dict, list)):
-                        result = find_deepest_array(item, new_path)
-                        if result is not None:
-                            return result
-                if any(isinstance(x, (dict, list)) for x in data):
-                    return None
-                return path, data
+            stack = [(data, None)]
+            while stack:
+                node, link = stack.pop()
+                if isinstance(node, dict):
+                    children = [(value, (key, link)) for key, value in node.items()
+                                if isinstance(value, (dict, list))]
+                elif isinstance(node, list):
+                    children = [(item, (i, link)) for i, item in enumerate(node)
+                                if isinstance(item, (dict, list))]
+                    if not children:
+                        path = []
+                        while link is not None:
+                            key, link = link
+                            path.append(key)
+                        path.reverse()
+                        return path, node
+                else:
+                    continue
+                # Push in reverse so children are visited in their original order
+                stack.extend(reversed(children))
             return None
             
         def get_nested_value(data: Any, path: List) -> Any:
@@ -161,7 +168,7 @@ def merge_yaml_arrays(yaml_str1: str, yaml_str2: str) -> str:
         result = process_multiline_strings(result)
         
         # Convert back to YAML string with proper formatting
-        return yaml.dump(result, allow_unicode=True, sort_keys=False, indent=2, default_flow_style=False)
+        return yaml.dump(result, Dumper=SafeDumper, allow_unicode=True, sort_keys=False, indent=2, default_flow_style=False)
         
     except yaml.YAMLError as e:
         raise yaml.YAMLError(f"Error parsing YAML: {str(e)}")
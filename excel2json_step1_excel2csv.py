@@ -1,8 +1,17 @@
 import openpyxl
 import csv
 import sys
-from openpyxl.utils import get_column_letter, column_index_from_string
-from typing import Optional, List, NamedTuple
+from xml.etree.ElementTree import iterparse
+from openpyxl.utils import column_index_from_string
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from typing import Any, Dict, Optional, List, NamedTuple, Tuple
+
+# シートXML内の結合セル要素のタグ名
+MERGE_CELL_TAG = f'{{{SHEET_MAIN_NS}}}mergeCell'
+
+# CSV書き出し時のバッファサイズ（書き込みのシステムコール回数を減らす）
+WRITE_BUFFER_SIZE = 1 << 20
 
 # 対象データ範囲を表す
 class TargetRange(NamedTuple):
@@ -10,6 +19,15 @@ class TargetRange(NamedTuple):
     end_row: int
     target_cols: List[int]
 
+# 結合セル範囲の形状と左上セルの値（セル毎の属性参照を避けるため平坦に保持する）
+class MergeInfo(NamedTuple):
+    min_row: int
+    min_col: int
+    max_row: int
+    max_col: int
+    is_vertical: bool
+    anchor_value: Any
+
 # Excelファイルおよびシートの読み込みと開始位置の情報を保持する
 class ExcelDocument:
     def __init__(self, excel_file: str, sheet_name: Optional[str] = None, start_cell: str = 'A1'):
@@ -19,10 +37,14 @@ class ExcelDocument:
         self.excel_file = excel_file
         self.sheet_name = sheet_name
         self.start_cell = start_cell
-        self.workbook = openpyxl.load_workbook(excel_file, data_only=True)
+        # read_only で開き、行を逐次読み込む（全セルのオブジェクトをメモリ上に展開しない）
+        self.workbook = openpyxl.load_workbook(excel_file, data_only=True, read_only=True)
         self._select_sheet()
         self.start_col = column_index_from_string(self.start_cell[0])
         self.start_row = int(self.start_cell[1:])
+        # セルの値と結合セル範囲を一度だけ読み込み、以降はスナップショットを参照する
+        self.sheet = SheetSnapshot(self.sheet, self.start_col, excel_file)
+        self.workbook.close()
 
     def _select_sheet(self) -> None:
         # シート名の決定
@@ -35,31 +57,98 @@ class ExcelDocument:
             raise ValueError(f"Sheet '{self.sheet_name}' not found in workbook")
         self.sheet = self.workbook[self.sheet_name]
 
+def read_merged_ranges(sheet, excel_file: Optional[str] = None) -> List[CellRange]:
+    """
+    シートの結合セル範囲を返す。
+    read_only モードのシートは merged_cells を持たないため、シートのXMLから mergeCell 要素を読み取る。
+    XMLの読み出しには openpyxl 内部の _get_source() を使うので、それが無い版では
+    excel_file を通常モードで開き直して merged_cells を参照する。
+    """
+    if hasattr(sheet, 'merged_cells'):
+        return list(sheet.merged_cells.ranges)
+    get_source = getattr(sheet, '_get_source', None)
+    if get_source is None:
+        if excel_file is None:
+            raise ValueError("結合セル範囲を読み取れません（excel_file を指定してください）")
+        workbook = openpyxl.load_workbook(excel_file)
+        try:
+            return list(workbook[sheet.title].merged_cells.ranges)
+        finally:
+            workbook.close()
+    ranges = []
+    with get_source() as src:
+        for _, element in iterparse(src):
+            if element.tag == MERGE_CELL_TAG:
+                ranges.append(CellRange(element.get('ref')))
+            element.clear()
+    return ranges
+
+# シートのセル値と結合セル範囲を保持する
+class SheetSnapshot:
+    def __init__(self, sheet, min_cols: int = 1, excel_file: Optional[str] = None):
+        """
+        シートの全セルの値を iter_rows で一括取得し、結合セル範囲とあわせて保持する。
+        read_only モードのシートはセルへのランダムアクセスが遅いため、解析はこちらに対して行う。
+        excel_file は結合セル範囲を通常モードで読み直す場合に使う（read_merged_ranges を参照）。
+        """
+        rows = list(sheet.iter_rows(min_row=1, min_col=1, values_only=True))
+        # read_only モードではシートの寸法が不明な場合があるため、最長の行に揃えて右側を補完する
+        width = max([min_cols] + [len(row) for row in rows])
+        self.rows = [row if len(row) == width else tuple(row) + (None,) * (width - len(row)) for row in rows]
+        self.max_row = len(self.rows)
+        self.max_column = width
+        # 1列目（行の種別を表すマーカー）は各処理で繰り返し参照するため、大文字化して保持しておく
+        self.markers = [str(row[0] or '').upper() for row in self.rows]
+        self.merged_ranges = read_merged_ranges(sheet, excel_file)
+        # 結合セル範囲に含まれる全セルの (row, col) → 結合情報 の索引を作り、定数時間で引けるようにする
+        self.merge_map: Dict[Tuple[int, int], MergeInfo] = {}
+        for merge_range in self.merged_ranges:
+            min_row, min_col, max_row, max_col = merge_range.min_row, merge_range.min_col, merge_range.max_row, merge_range.max_col
+            info = MergeInfo(min_row, min_col, max_row, max_col, min_col == max_col, self.value(min_row, min_col))
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self.merge_map.setdefault((row, col), info)
+        # 結合セルを含む行番号（空行の判定で、値の無いセルが結合先の値を持つ可能性を考慮するため）
+        self.merged_rows = {row for row, _ in self.merge_map}
+
+    def value(self, row: int, col: int) -> Any:
+        """
+        (row, col)（1-indexed）のセルの値を返す。範囲外のセルは None とする。
+        """
+        if 1 <= row <= self.max_row and 1 <= col <= self.max_column:
+            return self.rows[row - 1][col - 1]
+        return None
+
+    def find_merged_range(self, row: int, col: int) -> Optional[MergeInfo]:
+        """
+        (row, col) を含む結合セル範囲の情報を返す。結合セルでなければ None を返す。
+        """
+        return self.merge_map.get((row, col))
+
 # セルの値の処理を担当するヘルパークラス
 class CellProcessor:
     @staticmethod
-    def process_layout_cell(sheet, row: int, col: int, check_prefix: bool = True) -> str:
+    def process_layout_cell(sheet: SheetSnapshot, row: int, col: int, check_prefix: bool = True) -> str:
         """
         LAYOUT行内のセルの値を処理する。結合セルの場合は左上セルの値を参照し、
         値が文字列の場合は'#'プレフィックスの除去を行う。
         """
-        cell = sheet.cell(row=row, column=col)
-        if cell.coordinate in sheet.merged_cells:
-            merge_range = next(r for r in sheet.merged_cells.ranges if cell.coordinate in r)
-            if cell.coordinate == merge_range.start_cell.coordinate:
-                value = cell.value
+        merge_range = sheet.find_merged_range(row, col)
+        if merge_range is not None:
+            if row == merge_range.min_row and col == merge_range.min_col:
+                value = merge_range.anchor_value
                 if check_prefix and value and isinstance(value, str):
                     if value.startswith('#'):
                         value = value[1:]
                     else:
                         value = ""
             else:
-                start_cell_value = sheet.cell(row=merge_range.min_row, column=merge_range.min_col).value
+                start_cell_value = merge_range.anchor_value
                 if check_prefix and start_cell_value and isinstance(start_cell_value, str) and start_cell_value.startswith('#'):
                     return '<'
                 return ''
         else:
-            value = cell.value
+            value = sheet.value(row, col)
             if check_prefix and value and isinstance(value, str):
                 if value.startswith('#'):
                     value = value[1:]
@@ -68,27 +157,25 @@ class CellProcessor:
         return str(value) if value is not None else ''
 
     @staticmethod
-    def process_data_cell(sheet, row: int, col: int, check_prefix: bool = True) -> str:
+    def process_data_cell(sheet: SheetSnapshot, row: int, col: int, check_prefix: bool = True) -> str:
         """
         データ部門のセルの値を処理する。結合セルの縦横の状況に応じて、
         先頭セル以外は空文字を返すなどの処理を行う。
         """
-        cell = sheet.cell(row=row, column=col)
-        if cell.coordinate in sheet.merged_cells:
-            merge_range = next(r for r in sheet.merged_cells.ranges if cell.coordinate in r)
-            is_vertical_merge = merge_range.min_col == merge_range.max_col
-            if is_vertical_merge:
-                if cell.coordinate == merge_range.start_cell.coordinate:
-                    value = cell.value
+        merge_range = sheet.find_merged_range(row, col)
+        if merge_range is not None:
+            if merge_range.is_vertical:
+                if row == merge_range.min_row and col == merge_range.min_col:
+                    value = merge_range.anchor_value
                 else:
                     return ''
             else:
                 if row == merge_range.min_row:
-                    value = sheet.cell(row=merge_range.min_row, column=merge_range.min_col).value
+                    value = merge_range.anchor_value
                 else:
                     return ''
         else:
-            value = cell.value
+            value = sheet.value(row, col)
 
         if check_prefix and value and isinstance(value, str) and value.startswith('#'):
             value = value[1:]
@@ -116,14 +203,18 @@ class LayoutSection:
 
     def _find_layout_rows(self) -> List[int]:
         """
-        開始セルから最終行までの範囲で、1列目が'LAYOUT'と一致する行番号を返す。
+        開始セルから下方向に、1列目が'LAYOUT'と一致する行番号を返す。
+        LAYOUT行はシート上部にまとまっているため、LAYOUT行を見つけた後に
+        'LAYOUT'以外のマーカー（'START'や'DATA'など）が現れた時点で走査を打ち切る。
         """
+        markers = self.sheet.markers
         layout_rows = []
-        max_row = self.sheet.max_row
-        for row in range(self.start_row, max_row + 1):
-            value = str(self.sheet.cell(row=row, column=1).value or '').upper()
-            if value == 'LAYOUT':
+        for row in range(self.start_row, self.sheet.max_row + 1):
+            marker = markers[row - 1]
+            if marker == 'LAYOUT':
                 layout_rows.append(row)
+            elif marker and layout_rows:
+                break
         return layout_rows
 
     def _find_target_columns(self) -> List[int]:
@@ -132,14 +223,17 @@ class LayoutSection:
         """
         target_set = set()
         max_col = self.sheet.max_column
+        # 結合セルの索引と行データはループの外で一度だけ取り出しておく
+        get_merged = self.sheet.merge_map.get
+        rows = self.sheet.rows
         for layout_row in self.layout_rows:
+            row_values = rows[layout_row - 1]
             for col in range(self.start_col + 1, max_col + 1):
-                cell = self.sheet.cell(row=layout_row, column=col)
-                if cell.coordinate in self.sheet.merged_cells:
-                    merge_range = next(r for r in self.sheet.merged_cells.ranges if cell.coordinate in r)
-                    value = self.sheet.cell(row=merge_range.min_row, column=merge_range.min_col).value
+                merge_range = get_merged((layout_row, col))
+                if merge_range is not None:
+                    value = merge_range.anchor_value
                 else:
-                    value = cell.value
+                    value = row_values[col - 1]
                 if value and isinstance(value, str) and value.startswith('#'):
                     target_set.add(col)
         return sorted(target_set)
@@ -149,20 +243,18 @@ class LayoutSection:
         LAYOUT行の内容を抽出し、CSV出力用の2次元リストを作成する。
         """
         csv_layout = []
-        max_row = self.sheet.max_row
-        for row in range(self.start_row, max_row + 1):
-            if str(self.sheet.cell(row=row, column=1).value or '').upper() == 'LAYOUT':
-                row_data = []
-                for col in self.target_cols:
-                    if col == self.target_cols[0]:
-                        value = CellProcessor.process_layout_cell(self.sheet, row, col, check_prefix=False)
-                    else:
-                        value = CellProcessor.process_layout_cell(self.sheet, row, col, check_prefix=True)
-                    row_data.append(value)
-                # 1列目以外が全て空の場合は無視する
-                if all(x == '' for x in row_data[1:]):
-                    continue
-                csv_layout.append(row_data)
+        # LAYOUT行は _find_layout_rows で特定済みのため、シートを再走査しない
+        # 先頭列（プレフィックス判定なし）とそれ以外の列の分岐はループの外で済ませておく
+        sheet = self.sheet
+        process_cell = CellProcessor.process_layout_cell
+        first_col, rest_cols = self.target_cols[0], self.target_cols[1:]
+        for row in self.layout_rows:
+            row_data = [process_cell(sheet, row, first_col, False)]
+            row_data.extend([process_cell(sheet, row, col, True) for col in rest_cols])
+            # 1列目以外が全て空の場合は無視する
+            if all(x == '' for x in row_data[1:]):
+                continue
+            csv_layout.append(row_data)
         return csv_layout
 
 # データ部門の処理を担当するクラス
@@ -184,13 +276,14 @@ class DataSection:
         start_keywords = ['START']
         end_keywords = ['END', 'FINISH', 'FIN']
         start_row = self.last_layout_row + 1
+        markers = self.sheet.markers
         for row in range(self.last_layout_row + 1, max_row + 1):
-            if str(self.sheet.cell(row=row, column=1).value or '').upper() in start_keywords:
+            if markers[row - 1] in start_keywords:
                 start_row = row
                 break
         end_row = max_row
         for row in range(start_row, max_row + 1):
-            if str(self.sheet.cell(row=row, column=1).value or '').upper() in end_keywords:
+            if markers[row - 1] in end_keywords:
                 end_row = row - 1
                 break
         return TargetRange(start_row, end_row, self.target_cols)
@@ -201,16 +294,21 @@ class DataSection:
         """
         csv_data = []
         skip_keywords = ['none', 'not', 'no']
+        # 先頭列（プレフィックス判定なし）とそれ以外の列の分岐はループの外で済ませておく
+        sheet = self.sheet
+        process_cell = CellProcessor.process_data_cell
+        target_cols = self.target_range.target_cols
+        first_col, rest_cols = target_cols[0], target_cols[1:]
+        rows, merged_rows = sheet.rows, sheet.merged_rows
         for row in range(self.target_range.start_row, self.target_range.end_row + 1):
-            if str(self.sheet.cell(row=row, column=1).value or '').lower() in skip_keywords:
+            if str(sheet.value(row, 1) or '').lower() in skip_keywords:
                 continue
-            row_data = []
-            for col in self.target_range.target_cols:
-                if col == self.target_range.target_cols[0]:
-                    value = CellProcessor.process_data_cell(self.sheet, row, col, check_prefix=False)
-                else:
-                    value = CellProcessor.process_data_cell(self.sheet, row, col, check_prefix=True)
-                row_data.append(value)
+            # 対象列がすべて空で結合セルも含まない行は、セルごとの処理をせずに読み飛ばす
+            row_values = rows[row - 1]
+            if row not in merged_rows and all(row_values[col - 1] in (None, '') for col in target_cols):
+                continue
+            row_data = [process_cell(sheet, row, first_col, False)]
+            row_data.extend([process_cell(sheet, row, col, True) for col in rest_cols])
             csv_data.append(row_data)
         return csv_data
 
@@ -221,7 +319,7 @@ class CSVWriter:
         """
         与えられた2次元リストのデータをCSVファイルに出力する。
         """
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
+        with open(filename, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
             writer = csv.writer(f)
             writer.writerows(data)
 
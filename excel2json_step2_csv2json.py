@@ -1,15 +1,128 @@
 #!/usr/bin/env python
 import csv
 import json
+import re
 import sys
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, Tuple, Dict, Any, Optional
 import yaml
 
+# libyaml の C 実装が使える場合はそちらを利用する
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で出力する
+    orjson = None
+
 
 # ─────────────────────────────
 # 補助関数群（内部で利用する関数）
 # ─────────────────────────────
 
+# 行頭のインデント（orjson の2スペースインデントを4スペースに揃えるため）
+_LEADING_SPACES_RE = re.compile(r'^ +', re.MULTILINE)
+
+# int() / float() が受け付ける数値文字列の先頭になり得る記号
+_NUMERIC_HEAD = frozenset('+-.')
+
+
+def convert_value(value: str) -> Any:
+    """
+    セルの文字列を数値に変換できる場合は int / float に変換して返す。
+    変換できない場合は文字列のまま返す。
+    数値になり得ない先頭文字の場合は例外を発生させずにそのまま返す。
+    """
+    if not value:
+        return value
+    if value.isdecimal():
+        return int(value)
+    head = value[0]
+    if head not in _NUMERIC_HEAD and not head.isdecimal() and not head.isspace():
+        return value
+    try:
+        if '.' in value:
+            return float(value)
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _orjson_compatible(data: Any) -> bool:
+    """
+    data 内の float がすべて orjson でも標準の json と同じ表記になるかを返す。
+    orjson は inf / nan を null に、1e16 を "1e16"（json では "1e+16"）、1e-05 を "0.00001" と出力するため、
+    指数表記になる範囲（1e-4 未満、1e16 以上）や非有限の値を含む場合は False とする。
+    """
+    stack = [data]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        value = pop()
+        if type(value) is float:
+            # nan は比較がすべて偽、inf は上限を超えるため、ここで除外される
+            if value and not 1e-4 <= abs(value) < 1e16:
+                return False
+        elif type(value) is dict:
+            extend(value.values())
+        elif type(value) is list:
+            extend(value)
+    return True
+
+
+def dumps_json(data: Any) -> str:
+    """
+    data を4スペースインデントの JSON 文字列に変換する（非 ASCII 文字はそのまま出力する）。
+    orjson が利用できる場合はそちらで変換し、インデント幅だけ標準の json に合わせる。
+    float の表記が標準の json と異なってしまう場合は、標準の json で変換する。
+    """
+    if orjson is not None and _orjson_compatible(data):
+        try:
+            text = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            # 64bitを超える整数や文字列以外のキーなど orjson で扱えない値は標準の json にまかせる
+            pass
+        else:
+            # JSON 文字列中の改行はエスケープされるため、行頭の空白はすべてインデントとみなせる
+            return _LEADING_SPACES_RE.sub(lambda m: m.group(0) * 2, text)
+    return json.dumps(data, indent=4, ensure_ascii=False)
+
+
+def make_setter(path: List[Tuple[str, bool]]) -> Callable[[Dict[str, Any], str], None]:
+    """
+    path の階層に沿って値をセットする関数を生成する（set_value の cont_elements なし版）。
+    列ごとに一度だけ生成しておき、行ごとのパス解析を省く。
+    """
+    parents = tuple(path[:-1])
+    leaf_field, leaf_is_array = path[-1]
+
+    def setter(record: Dict[str, Any], value: str) -> None:
+        current = record
+        for field, is_array in parents:
+            if is_array:
+                if field not in current or not isinstance(current[field], list):
+                    current[field] = []
+                if not current[field]:
+                    current[field].append({})
+                current = current[field][-1]
+            else:
+                if field not in current or not isinstance(current[field], dict):
+                    current[field] = {}
+                current = current[field]
+        if leaf_is_array:
+            # 末端が配列の場合は要素を用意するのみ（値はセットしない）
+            if leaf_field not in current or not isinstance(current[leaf_field], list):
+                current[leaf_field] = []
+            if not current[leaf_field]:
+                current[leaf_field].append({})
+        else:
+            current[leaf_field] = convert_value(value)
+
+    return setter
+
+
 def set_value(record: Dict[str, Any],
               path: List[Tuple[str, bool]],
               value: str,
@@ -40,14 +153,7 @@ def set_value(record: Dict[str, Any],
         else:
             if i == len(path) - 1:
                 # 葉ノードなら値をセット（数値変換も試みる）
-                try:
-                    if '.' in value:
-                        conv = float(value)
-                    else:
-                        conv = int(value)
-                    current[field] = conv
-                except ValueError:
-                    current[field] = value
+                current[field] = convert_value(value)
             else:
                 if field not in current or not isinstance(current[field], dict):
                     current[field] = {}
@@ -57,19 +163,19 @@ def set_value(record: Dict[str, Any],
 def find_deepest_list(data: Any) -> Optional[list]:
     """
     入れ子になったデータ構造中で、一番深い階層にあるリストを返す。
+    先頭から順に探索し、リストが見つかればその中だけを探索対象として更に深いリストを探す。
     """
-    if isinstance(data, list):
-        for item in data:
-            deeper_list = find_deepest_list(item)
-            if deeper_list is not None:
-                return deeper_list
-        return data
-    elif isinstance(data, dict):
-        for value in data.values():
-            deeper_list = find_deepest_list(value)
-            if deeper_list is not None:
-                return deeper_list
-    return None
+    deepest = None
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            deepest = node
+            # 以降はこのリストの要素のみを先頭から探索する
+            stack = node[::-1]
+        elif isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+    return deepest
 
 
 def merge_yaml_dicts(yaml_str1: str, yaml_str2: str) -> Dict[str, Any]:
@@ -80,7 +186,56 @@ def merge_yaml_dicts(yaml_str1: str, yaml_str2: str) -> Dict[str, Any]:
     combined_yaml = yaml_str1 + "\n---\n" + yaml_str2
     merged_dict = {}
 
-    for doc in yaml.safe_load_all(combined_yaml):
+    for doc in yaml.load_all(combined_yaml, Loader=SafeLoader):
+        for key, value in doc.items():
+            if key in merged_dict:
+                if isinstance(merged_dict[key], list):
+                    deepest_list = find_deepest_list(merged_dict[key])
+                    if deepest_list is not None:
+                        if isinstance(value, list):
+                            deepest_value_list = find_deepest_list(value)
+                            if deepest_value_list is not None:
+                                deepest_list.extend(deepest_value_list)
+                            else:
+                                deepest_list.extend(value)
+                        else:
+                            deepest_list.append(value)
+                    else:
+                        if isinstance(value, list):
+                            merged_dict[key].extend(value)
+                        else:
+                            merged_dict[key].append(value)
+                elif isinstance(merged_dict[key], dict) and isinstance(value, dict):
+                    merged_dict[key] = merge_yaml_dicts(yaml.dump(merged_dict[key], Dumper=SafeDumper),
+                                                        yaml.dump(value, Dumper=SafeDumper))
+                else:
+                    merged_dict[key] = value
+            else:
+                merged_dict[key] = value
+    return merged_dict
+
+
+def _sorted_copy(data: Any) -> Any:
+    """
+    辞書のキーを昇順に並べ替えた複製を返す（リスト内の辞書も再帰的に処理する）。
+    yaml.dump（sort_keys=True）→ 再読み込みした場合と同じキー順・同じ値になる。
+    """
+    if isinstance(data, dict):
+        return {key: _sorted_copy(data[key]) for key in sorted(data)}
+    if isinstance(data, list):
+        return [_sorted_copy(item) for item in data]
+    return data
+
+
+def merge_dicts(dict1: Dict[str, Any], dict2: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    2つの辞書を統合し、新しい辞書として返す。
+    merge_yaml_dicts と同じ規則でマージするが、YAML 文字列への変換・再解析は行わない。
+    - 配列の場合は、最も深い階層のリスト同士でマージを行う。
+    """
+    merged_dict = {}
+
+    for doc in (_sorted_copy(dict1), _sorted_copy(dict2)):
         for key, value in doc.items():
             if key in merged_dict:
                 if isinstance(merged_dict[key], list):
@@ -100,7 +255,7 @@ def merge_yaml_dicts(yaml_str1: str, yaml_str2: str) -> Dict[str, Any]:
                         else:
                             merged_dict[key].append(value)
                 elif isinstance(merged_dict[key], dict) and isinstance(value, dict):
-                    merged_dict[key] = merge_yaml_dicts(yaml.dump(merged_dict[key]), yaml.dump(value))
+                    merged_dict[key] = merge_dicts(merged_dict[key], value)
                 else:
                     merged_dict[key] = value
             else:
@@ -120,6 +275,10 @@ class Header:
         self.raw_rows = header_rows
         self.grid = self._build_header_grid()
         self.col_to_path = self._build_col_to_path()
+        # 各列の値をセットする関数（列番号の昇順）
+        self.col_setters: List[Tuple[int, Callable[[Dict[str, Any], str], None]]] = [
+            (col, make_setter(self.col_to_path[col])) for col in sorted(self.col_to_path)
+        ]
         self.num_cols = max(len(row) for row in self.grid)
         # ヘッダー情報：各列番号に対する階層パスの一覧
         self.header_info = {str(col): self.col_to_path[col]
@@ -187,9 +346,13 @@ class Record:
     def __init__(self,
                  col_to_path: Dict[int, List[Tuple[str, bool]]],
                  num_cols: int,
-                 base_row: List[str]):
+                 base_row: List[str],
+                 col_setters: Optional[List[Tuple[int, Callable[[Dict[str, Any], str], None]]]] = None):
         self.col_to_path = col_to_path
         self.num_cols = num_cols
+        if col_setters is None:
+            col_setters = [(col, make_setter(col_to_path[col])) for col in sorted(col_to_path)]
+        self.col_setters = col_setters
         self.data = self._create_nested_record(base_row)
 
     def _create_nested_record(self, row: List[str]) -> Dict[str, Any]:
@@ -197,13 +360,14 @@ class Record:
         １行分のデータから、ヘッダー情報に沿った入れ子構造の辞書を生成する。
         """
         record: Dict[str, Any] = {}
-        # 列数が足りなければ右側を空文字で補完
-        if len(row) < self.num_cols:
-            row = row + [""] * (self.num_cols - len(row))
-        for col in range(self.num_cols):
-            cell = row[col].strip() if col < len(row) else ""
-            if cell and col in self.col_to_path:
-                set_value(record, self.col_to_path[col], cell)
+        # パスを持つ列だけを走査する（行の長さが足りない列は空として扱う）
+        row_len = len(row)
+        for col, setter in self.col_setters:
+            if col >= self.num_cols or col >= row_len:
+                continue
+            cell = row[col].strip()
+            if cell:
+                setter(record, cell)
         return record
 
     def add_continuation_row(self, row: List[str]) -> None:
@@ -211,16 +375,14 @@ class Record:
         継続行として新たな行データをマージする。
         """
         new_record = self._create_nested_record(row)
-        base_yaml = yaml.dump(self.data, allow_unicode=True)
-        new_yaml = yaml.dump(new_record, allow_unicode=True)
-        merged_dict = merge_yaml_dicts(base_yaml, new_yaml)
-        self.data = merged_dict
+        # YAML 文字列を経由せず、辞書のまま統合する
+        self.data = merge_dicts(self.data, new_record)
 
     def to_json(self) -> str:
         """
         内部の辞書データを JSON 文字列に変換して返す。
         """
-        return json.dumps(self.data, indent=4, ensure_ascii=False)
+        return dumps_json(self.data)
 
 
 # ─────────────────────────────
@@ -234,11 +396,13 @@ class CSVLayoutParser:
     def __init__(self, csv_filename: str):
         self.filename = csv_filename
         self.header_rows: List[List[str]] = []
-        self.data_rows: List[List[str]] = []
+        # データ部は読み込み時にレコードグループ（新規行＋継続行、マーカー除去済み）へまとめる
+        self.record_groups: List[List[List[str]]] = []
         self.records: List[Record] = []
         self.header: Optional[Header] = None
         self.header_info: Dict[str, Any] = {}
         self.col_to_path: Dict[int, List[Tuple[str, bool]]] = {}
+        self.col_setters: List[Tuple[int, Callable[[Dict[str, Any], str], None]]] = []
         self.num_cols: int = 0
 
     def parse(self) -> Dict[str, Any]:
@@ -256,16 +420,24 @@ class CSVLayoutParser:
 
     def _read_csv(self) -> None:
         """
-        CSV ファイルを読み込み、ヘッダー部（"LAYOUT" 行）とデータ部に分ける。
+        CSV ファイルを1行ずつ読み込み、ヘッダー部（"LAYOUT" 行）とデータ部に分ける。
+        データ部はその場でレコードグループ（新規行＋継続行）ごとにまとめる。
         """
+        record_groups = self.record_groups
         with open(self.filename, newline='', encoding='utf-8') as f:
-            rows = list(csv.reader(f))
-        for row in rows:
-            if row and row[0].strip().upper() == "LAYOUT":
-                # ヘッダー行は先頭セル "LAYOUT" を除く
-                self.header_rows.append(row[1:])
-            else:
-                self.data_rows.append(row)
+            for row in csv.reader(f):
+                if row and row[0].strip().upper() == "LAYOUT":
+                    # ヘッダー行は先頭セル "LAYOUT" を除く
+                    self.header_rows.append(row[1:])
+                    continue
+                if not row or all(not cell.strip() for cell in row):
+                    continue
+                marker = row[0].strip()
+                # マーカーは除去する。先頭が継続行の場合も新しいグループとして扱う
+                if marker != "*" or not record_groups:
+                    record_groups.append([row[1:]])
+                else:
+                    record_groups[-1].append(row[1:])
         if not self.header_rows:
             raise ValueError("ヘッダー部（LAYOUT 行）が見つかりません。")
 
@@ -275,32 +447,18 @@ class CSVLayoutParser:
         """
         self.header = Header(self.header_rows)
         self.col_to_path = self.header.col_to_path
+        self.col_setters = self.header.col_setters
         self.num_cols = self.header.num_cols
         self.header_info = self.header.header_info
 
     def _process_data(self) -> None:
         """
-        データ部の各行をレコードグループ（新規行＋継続行）ごとにまとめ、各レコードを生成する。
+        レコードグループ（新規行＋継続行）ごとに、各レコードを生成する。
         """
-        record_groups: List[List[List[str]]] = []  # 1レコード＝複数行のリスト
-        current_group: List[List[str]] = []
-        for row in self.data_rows:
-            if not row or all(not cell.strip() for cell in row):
-                continue
-            marker = row[0].strip()
-            if marker != "*":
-                if current_group:
-                    record_groups.append(current_group)
-                current_group = [row[1:]]  # マーカーは除去
-            else:
-                current_group.append(row[1:])
-        if current_group:
-            record_groups.append(current_group)
-
-        for group in record_groups:
+        for group in self.record_groups:
             # グループの先頭行から新規レコードを生成し、
             # 継続行があれば順次マージする。
-            record = Record(self.col_to_path, self.num_cols, group[0])
+            record = Record(self.col_to_path, self.num_cols, group[0], self.col_setters)
             for cont_row in group[1:]:
                 record.add_continuation_row(cont_row)
             self.records.append(record)
@@ -319,6 +477,6 @@ if __name__ == "__main__":
     result = parser.parse()
     # レコードが存在する場合は JSON 文字列として出力
     if result["records"]:
-        print(json.dumps(result["records"], indent=4, ensure_ascii=False))
+        print(dumps_json(result["records"]))
     else:
         print("{}")
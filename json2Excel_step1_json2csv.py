@@ -1,124 +1,256 @@
 import json
+import re
 import sys
 import argparse
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson が無い環境では標準の json で読み込む
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson が無い環境では --stream を利用できない
+    ijson = None
+
+
+# 19桁以上の数字列（64bit 整数の範囲を超え得る数値）
+_LONG_DIGITS_RE = re.compile(rb'\d{19}')
+
+# TXT 書き出し時のバッファサイズ
+WRITE_BUFFER_SIZE = 1 << 20
+
+# セル値の型ごとの文字列変換関数（セル毎の isinstance 判定を避けるため）
+_TO_STR = {
+    bool: lambda v: "TRUE" if v else "FALSE",
+    int: str,
+    float: str,
+    str: str,
+    type(None): lambda v: "",
+}
 
 
 class JsonToTxtConverter:
     def __init__(self) -> None:
         # 読み込んだ JSON データ本体（オプション）
         self.data: Any = None
-        # カラムパス（例: [["foo"], ["foo[]", "value"], ...]）
-        self.column_paths: List[List[str]] = []
+        # カラムパス（例: [("foo",), ("foo[]", "value"), ...]）
+        self.column_paths: List[Tuple[str, ...]] = []
         # 各カラムパスに対応するすべての値のリスト
         # 例: {("foo",): ["val1", "val2"], ...}
         self.path_to_values: Dict[Tuple[str, ...], List[Any]] = defaultdict(list)
+        # column_paths と同じ並びの値リスト（DATA 行の生成時に列番号で直接引くため）
+        self.column_values: List[List[Any]] = []
         # True の場合、LAYOUT 行で同じキーが連続しているときの置換処理をスキップする
         # （デフォルトでは連続キーは「<」に置換します）
         self.disable_duplicate_layout: bool = False
 
     def load_json(self, filename: str) -> None:
         """
-        JSON ファイルを読み込み、内部状態（data, column_paths, path_to_values）を更新する。
+        JSON ファイルを読み込み、内部状態（data, column_paths, column_values, path_to_values）を更新する。
+        """
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        self.data = self._parse_json(raw)
+        self._reset_state()
+        self._collect_leaf_paths(self.data)
+        self._build_columns()
+
+    def load_json_stream(self, filename: str, prefix: str) -> None:
+        """
+        JSON ファイルのうち prefix（ijson の形式。例: "mailsets.mailset.item"）で指定した要素だけを
+        ijson で1件ずつ読み込み、内部状態を更新する。JSON 全体のツリーは保持しない（data は None のまま）。
+        prefix 以外の部分の値は出力対象にならない。
         """
-        with open(filename, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
+        if ijson is None:
+            raise RuntimeError("--stream を利用するには ijson をインストールしてください。")
+        self.data = None
         self._reset_state()
-        self._collect_leaf_paths(self.data, path=[])
+        base_path = self._prefix_to_path(prefix)
+        with open(filename, 'rb') as f:
+            for item in ijson.items(f, prefix, use_float=True):
+                self._collect_leaf_paths(item, base_path)
+        self._build_columns()
+
+    @staticmethod
+    def _prefix_to_path(prefix: str) -> Tuple[str, ...]:
+        """
+        ijson の prefix を、_collect_leaf_paths が使うカラムパスに変換する。
+        配列要素を表す "item" は、直前のキーを "キー[]"（ルート直下なら "ROOT[]"）に置き換える。
+        """
+        path: Tuple[str, ...] = ()
+        for token in prefix.split('.') if prefix else []:
+            if token == 'item':
+                path = path[:-1] + (f"{path[-1]}[]",) if path else ("ROOT[]",)
+            else:
+                path += (token,)
+        return path
+
+    def _build_columns(self) -> None:
+        """
+        収集した path_to_values から column_paths / column_values を作成する。
+        """
         # カラムパスは path_to_values のキーから作成
         # ※再帰処理内で sorted() を使っているので、ここでのグローバルソートは不要です
-        self.column_paths = [list(path) for path in self.path_to_values.keys()]
+        # path_to_values のキーはすでにタプルなので、そのまま利用する
+        self.column_paths = list(self.path_to_values.keys())
+        self.column_values = [self.path_to_values[path] for path in self.column_paths]
         # もしグローバルソートを行うと親キー内での順序が崩れるため、ここではソートしません。
         # self.column_paths.sort(key=lambda p: (len(p), p))
 
+    @staticmethod
+    def _parse_json(raw: bytes) -> Any:
+        """
+        JSON のバイト列を解析する。orjson が利用できる場合はそちらで解析する。
+        orjson が受け付けない入力（NaN や 64bit を超える整数など）は標準の json にまかせる。
+        """
+        # orjson は 64bit を超える整数を黙って float にするため、長い数字列を含む場合も標準の json を使う
+        if orjson is not None and not _LONG_DIGITS_RE.search(raw):
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(raw.decode('utf-8'))
+
     def _reset_state(self) -> None:
         """
         内部状態をリセットする。
         JSON の再読み込み時などに利用。
         """
         self.column_paths.clear()
+        self.column_values.clear()
         self.path_to_values.clear()
 
-    def _collect_leaf_paths(self, node: Any, path: List[str]) -> None:
+    def _collect_leaf_paths(self, root: Any, path: Tuple[str, ...] = ()) -> None:
         """
-        JSON を再帰的に探索し、leaf（dict でも list でもない値）に到達した場合に
+        JSON を探索し、leaf（dict でも list でもない値）に到達した場合に
         現在のパスと値を内部状態に記録する。
 
         配列の場合はキーに "[]" を付与して区別する。
 
         また、dict のキーはソートして処理することで、親キーに属する子キーの範囲内で
         ソートした状態を保証する。
+
+        再帰呼び出しの代わりに明示的なスタックで深さ優先に辿る（深い JSON でも
+        RecursionError にならない）。パスはタプルで持ち、そのまま辞書のキーに使う。
+        path には root 自身のカラムパスを指定する（通常はルートなので空）。
         """
-        if isinstance(node, dict):
-            # dict のキーをソートしてから処理する
-            for key in sorted(node.keys()):
-                self._collect_leaf_paths(node[key], path + [key])
-        elif isinstance(node, list):
-            if not path:
-                # ルート直下が配列の場合
-                array_key = "ROOT[]"
-                new_path = path + [array_key]
+        path_to_values = self.path_to_values
+        # パスのトークンは同じ文字列が大量に繰り返されるため、intern して1つのオブジェクトにまとめる
+        intern = sys.intern
+        # 親パス → {キー: 値リスト}。配列内の同じ形の dict で、leaf ごとのタプル生成とハッシュ計算を省く
+        leaf_cache: Dict[Tuple[str, ...], Dict[str, List[Any]]] = {}
+        stack: List[Tuple[Any, Tuple[str, ...]]] = [(root, path)]
+        while stack:
+            node, path = stack.pop()
+            if isinstance(node, dict):
+                keys = sorted(node.keys())
+                if not any(isinstance(value, (dict, list)) for value in node.values()):
+                    # 値がすべて leaf の dict は、その場でキー順に値リストへ追加する
+                    # （スタックに積んだ場合も連続して取り出されるため、記録順は変わらない）
+                    leaf_lists = leaf_cache.get(path)
+                    if leaf_lists is None:
+                        leaf_lists = leaf_cache[path] = {}
+                    for key in keys:
+                        values = leaf_lists.get(key)
+                        if values is None:
+                            values = leaf_lists[key] = path_to_values[path + (intern(key),)]
+                        values.append(node[key])
+                    continue
+                # dict のキーをソートしてから処理する（後に積んだものから取り出されるため逆順に積む）
+                for key in reversed(keys):
+                    stack.append((node[key], path + (intern(key),)))
+            elif isinstance(node, list):
+                if not path:
+                    # ルート直下が配列の場合
+                    new_path = ("ROOT[]",)
+                else:
+                    # 既存の最後のキーを "キー[]" に変更
+                    new_path = path[:-1] + (intern(f"{path[-1]}[]"),)
+                stack.extend((item, new_path) for item in reversed(node))
             else:
-                # 既存の最後のキーを "キー[]" に変更
-                *parent, last = path
-                array_key = f"{last}[]"
-                new_path = parent + [array_key]
-            for item in node:
-                self._collect_leaf_paths(item, new_path)
-        else:
-            # node が leaf の場合、現在のパスと値を記録
-            self.path_to_values[tuple(path)].append(node)
+                # node が leaf の場合、現在のパスと値を記録
+                path_to_values[path].append(node)
 
     def get_txt_lines(self) -> List[str]:
         """
         内部状態から、LAYOUT 行と DATA 行を生成し、TXT 出力用の行リストを返す。
         """
-        lines: List[str] = []
+        return list(self._iter_txt_lines())
+
+    def _iter_txt_lines(self) -> Iterator[str]:
+        """
+        TXT 出力用の行（タブ区切り、改行なし）を1行ずつ返す。行リスト全体は保持しない。
+        """
+        for row in self._iter_rows():
+            yield "\t".join(row)
+
+    def _iter_rows(self) -> Iterator[List[str]]:
+        """
+        LAYOUT 行と DATA 行をセルのリストとして順に返す（タブ区切りへの結合は呼び出し側で行う）。
+        """
         if not self.column_paths:
-            return lines
+            return
 
         max_depth = self._get_max_column_depth()
 
         # LAYOUT 行の生成（各行はタブ区切り）
-        for depth in range(max_depth):
-            # 1列目は "LAYOUT" 固定、2列目は空文字
-            row = ["LAYOUT", ""]
-            for path in self.column_paths:
-                # カラムパスが現在の深さを持っていれば、"#" を付けて出力
-                row.append(f"#{path[depth]}" if len(path) > depth else "")
+        # 1列目は "LAYOUT" 固定、2列目は空文字。各カラムパスのトークンを一度の走査で
+        # 深さごとの行へ振り分け、パスが現在の深さを持っていれば "#" を付けて出力する
+        ncols = len(self.column_paths)
+        layout_rows = [["LAYOUT", ""] + [""] * ncols for _ in range(max_depth)]
+        for col, path in enumerate(self.column_paths, start=2):
+            for depth, token in enumerate(path):
+                layout_rows[depth][col] = f"#{token}"
+        for row in layout_rows:
             # もし duplicate キーの連続置換処理が有効なら実施する
             if not self.disable_duplicate_layout:
-                last_key = None
-                # 先頭の2セルはタイトル等なので、インデックス2以降を処理
-                for i in range(2, len(row)):
-                    # 空文字は処理対象外
-                    if row[i] != "":
-                        if last_key is not None and row[i] == last_key:
-                            row[i] = "<"
-                        else:
-                            last_key = row[i]
-                    else:
-                        # 空文字の場合は last_key をリセットしない
-                        # ※必要に応じて処理を変更してください
-                        last_key = row[i]
-            lines.append("\t".join(row))
+                self._collapse_dupes(row)
+            yield row
 
         # DATA 行の生成
         max_value_count = self._get_max_values_count()
+        # 列ごとの文字列変換関数を先に決めておき、セル毎の型判定を省く
+        # 値の数が最大値に満たない列だけ範囲チェックが必要なため、列を2つに分けておく
+        # （出力位置は列番号で保持する）
+        full_cols = []
+        short_cols = []
+        for col, values in enumerate(self.column_values, start=2):
+            entry = (col, values, self._make_formatter(values))
+            if len(values) == max_value_count:
+                full_cols.append(entry)
+            else:
+                short_cols.append(entry)
+        empty_cells = [""] * len(self.column_values)
         for i in range(max_value_count):
             # 1行目は "DATA"、2行目以降は "*" マーカー
-            marker = "DATA" if i == 0 else "*"
-            row = [marker, ""]
-            for path in self.column_paths:
-                values = self.path_to_values[tuple(path)]
+            row = ["DATA" if i == 0 else "*", ""] + empty_cells
+            for col, values, fmt in full_cols:
+                row[col] = fmt(values[i])
+            for col, values, fmt in short_cols:
                 if i < len(values):
-                    row.append(self._to_str(values[i]))
-                else:
-                    row.append("")
-            lines.append("\t".join(row))
+                    row[col] = fmt(values[i])
+            yield row
 
-        return lines
+    @staticmethod
+    def _collapse_dupes(row: List[str]) -> None:
+        """
+        LAYOUT 行で直前のセルと同じキーが続く場合、後続のセルを "<" に置き換える。
+        先頭の2セルはタイトル等なので、インデックス2以降を処理する。
+        空セルはキーの連続を途切れさせる（空セルをはさんだ同じキーは置換しない）。
+        """
+        last_key = None
+        for i in range(2, len(row)):
+            key = row[i]
+            if not key:
+                last_key = None
+                continue
+            if key == last_key:
+                row[i] = "<"
+            else:
+                last_key = key
 
     def _get_max_column_depth(self) -> int:
         """全カラムパスの中で最大の深さを返す。"""
@@ -126,30 +258,33 @@ class JsonToTxtConverter:
 
     def _get_max_values_count(self) -> int:
         """全カラムの中で最大の値の数を返す。"""
-        return max(len(values) for values in self.path_to_values.values())
+        return max(len(values) for values in self.column_values)
+
+    def _make_formatter(self, values: List[Any]) -> Callable[[Any], str]:
+        """
+        列の値がすべて同じ型であれば、その型専用の変換関数を返す。
+        型が混在する列は _to_str を返す。
+        """
+        types = {type(val) for val in values}
+        if len(types) == 1:
+            return _TO_STR.get(types.pop(), str)
+        return self._to_str
 
     def _to_str(self, val: Any) -> str:
         """
         値を文字列に変換する。
-        Boolean は大文字の TRUE/FALSE、整数はそのまま文字列化、それ以外は str() を利用する。
+        Boolean は大文字の TRUE/FALSE、None は空文字、それ以外は str() を利用する。
+        型ごとの変換関数は _TO_STR から引く（bool と int は type() で区別される）。
         """
-        if val is True:
-            return "TRUE"
-        elif val is False:
-            return "FALSE"
-        elif isinstance(val, int):
-            return str(val)
-        else:
-            return str(val) if val is not None else ""
+        return _TO_STR.get(type(val), str)(val)
 
     def write_txt(self, filename: str) -> None:
         """
-        内部状態から TXT 行リストを生成し、指定したファイルへ書き出す。
+        内部状態から TXT 行を生成し、指定したファイルへ書き出す。
         """
-        lines = self.get_txt_lines()
-        with open(filename, 'w', encoding='utf-8') as f:
-            for line in lines:
-                f.write(line + "\n")
+        # 行リスト全体を文字列として組み立てず、大きめのバッファ越しに逐次書き出す
+        with open(filename, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            f.writelines(line + "\n" for line in self._iter_txt_lines())
 
 
 def main():
@@ -163,6 +298,11 @@ def main():
         action="store_true",
         help="LAYOUT 行での連続する同一キーの置換処理を行わない（連続キーをそのまま出力する）"
     )
+    parser.add_argument(
+        "--stream",
+        metavar="PREFIX",
+        help="指定した要素（ijson の prefix 形式。例: mailsets.mailset.item）だけを ijson で逐次読み込む"
+    )
     args = parser.parse_args()
 
     input_json_file = args.input_json
@@ -170,7 +310,10 @@ def main():
 
     converter = JsonToTxtConverter()
     converter.disable_duplicate_layout = args.no_layout_dup
-    converter.load_json(input_json_file)
+    if args.stream:
+        converter.load_json_stream(input_json_file, args.stream)
+    else:
+        converter.load_json(input_json_file)
     converter.write_txt(output_txt_file)
     print(f"変換が完了しました: {output_txt_file}")
 
@@ -1,6 +1,57 @@
 import argparse
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, PatternFill
+from openpyxl.worksheet.cell_range import CellRange
+
+
+def layout_row_cells(ws, row_index, row, separate, no_color, candidate_colors, center, fills):
+    """
+    LAYOUT 行のセル一覧を作成する。2列目以降は中央揃えにし、--separate 指定がなければ
+    先頭セルに続く "<" のセルを結合して（結合範囲は ws.merged_cells に登録）、
+    結合セルの先頭に背景色を設定する。結合される側のセルは出力しない（None）。
+    """
+    cells = [row[0]]
+    for cell_val in row[1:]:
+        cell = WriteOnlyCell(ws, value=cell_val)
+        cell.alignment = center
+        cells.append(cell)
+
+    if not separate:
+        # 結合処理（結合対象は、先頭2セル("LAYOUT" とその次のセル)を除いた、リスト上の index 2 以降）
+        col = 2
+        last_merged_color = None  # 同じ行内で直前に結合したセルの背景色
+        while col < len(row):
+            cell_val = row[col]
+            # 結合グループの先頭は、値が空でなく、"<" でないセルとする
+            if cell_val and cell_val != "<":
+                group_start = col
+                group_end = col
+                # 直後のセルが "<" なら同じグループとみなす
+                while group_end + 1 < len(row) and row[group_end + 1] == "<":
+                    group_end += 1
+                if group_end > group_start:
+                    # Python のリスト index を Excel の列番号（1-indexed）に変換して結合範囲を登録する
+                    ws.merged_cells.add(CellRange(min_col=group_start + 1, min_row=row_index,
+                                                  max_col=group_end + 1, max_row=row_index))
+                    for merged in range(group_start + 1, group_end + 1):
+                        cells[merged] = None
+                    # 背景色付け（--no-color オプションがなければ）
+                    if not no_color:
+                        # 前グループの色と異なる色を候補から選択する
+                        chosen_color = None
+                        for color in candidate_colors:
+                            if color != last_merged_color:
+                                chosen_color = color
+                                break
+                        if chosen_color is None:
+                            chosen_color = candidate_colors[0]
+                        last_merged_color = chosen_color
+                        cells[group_start].fill = fills[chosen_color]
+                col = group_end + 1
+            else:
+                col += 1
+    return cells
 
 def main():
     parser = argparse.ArgumentParser(
@@ -19,19 +70,6 @@ def main():
     separate = args.separate
     no_color = args.no_color
 
-    # TXT ファイルを読み込み、各行をタブ区切りで分割する
-    with open(input_txt, 'r', encoding='utf-8') as f:
-        lines = f.read().splitlines()
-    data = [line.split("\t") for line in lines]
-
-    wb = Workbook()
-    ws = wb.active
-
-    # TXT の内容をセルに書き込む（行・列とも 1-indexed）
-    for row_index, row in enumerate(data, start=1):
-        for col_index, cell_value in enumerate(row, start=1):
-            ws.cell(row=row_index, column=col_index, value=cell_value)
-
     # LAYOUT 行の処理
     # ※レイアウト行は先頭セルが "LAYOUT" である行とします。
     #  ここでは、LAYOUT 行の2列目以降のセルを中央揃えにし、
@@ -39,51 +77,26 @@ def main():
     #  結合セルには背景色を設定します（--no-color 指定で色付けを抑制）。
     candidate_colors = ["FFCCCC", "CCFFCC", "CCCCFF", "FFFFCC", "FFCCFF", "CCFFFF"]
     # ※候補は薄いパステル調の色です。
+    center = Alignment(horizontal="center")
+    fills = {color: PatternFill(start_color=color, end_color=color, fill_type="solid")
+             for color in candidate_colors}
 
-    for row_index, row in enumerate(data, start=1):
-        if row and row[0] == "LAYOUT":
-            # LAYOUT 行の2列目以降（Excel では列2～）を中央揃えにする
-            for col_index in range(2, len(row) + 1):
-                cell = ws.cell(row=row_index, column=col_index)
-                cell.alignment = Alignment(horizontal="center")
+    # 書き込み専用モードでは、セルを1つずつ保持せずに行単位で XML へ書き出す
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
 
-            if not separate:
-                # 結合処理（結合対象は、先頭2セル("LAYOUT" とその次のセル)を除いた、リスト上の index 2 以降）
-                col = 2
-                last_merged_color = None  # 同じ行内で直前に結合したセルの背景色
-                while col < len(row):
-                    cell_val = row[col]
-                    # 結合グループの先頭は、値が空でなく、"<" でないセルとする
-                    if cell_val and cell_val != "<":
-                        group_start = col
-                        group_end = col
-                        # 直後のセルが "<" なら同じグループとみなす
-                        while group_end + 1 < len(row) and row[group_end + 1] == "<":
-                            group_end += 1
-                        if group_end > group_start:
-                            # Python のリスト index を Excel の列番号（1-indexed）に変換して merge_cells
-                            ws.merge_cells(start_row=row_index,
-                                           start_column=group_start + 1,
-                                           end_row=row_index,
-                                           end_column=group_end + 1)
-                            # 背景色付け（--no-color オプションがなければ）
-                            if not no_color:
-                                # 前グループの色と異なる色を候補から選択する
-                                chosen_color = None
-                                for color in candidate_colors:
-                                    if color != last_merged_color:
-                                        chosen_color = color
-                                        break
-                                if chosen_color is None:
-                                    chosen_color = candidate_colors[0]
-                                last_merged_color = chosen_color
-                                cell = ws.cell(row=row_index, column=group_start + 1)
-                                cell.fill = PatternFill(start_color=chosen_color,
-                                                        end_color=chosen_color,
-                                                        fill_type="solid")
-                        col = group_end + 1
-                    else:
-                        col += 1
+    # TXT ファイルを1行ずつ読み込み、タブ区切りで分割してそのままシートへ追加する
+    # （splitlines() と同じ区切りで行を分けるため、読み込んだ行をさらに splitlines() する）
+    row_index = 0
+    with open(input_txt, 'r', encoding='utf-8') as f:
+        for text in f:
+            for line in text.splitlines():
+                row_index += 1
+                row = line.split("\t")
+                if row[0] == "LAYOUT":
+                    row = layout_row_cells(ws, row_index, row, separate, no_color,
+                                           candidate_colors, center, fills)
+                ws.append(row)
 
     wb.save(output_xlsx)
     print(f"Excelファイルが作成されました: {output_xlsx}")